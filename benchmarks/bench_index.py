@@ -0,0 +1,116 @@
+"""
+Recall vs latency of the FAISS index types in modules.index_factory,
+measured against the exact flat baseline.
+
+    python -m benchmarks.bench_index --vectors 50000
+    python -m benchmarks.bench_index --pdf bundle.pdf       # real MiniLM chunk embeddings
+
+Synthetic vectors are drawn around random cluster centres, which is closer to
+sentence embeddings than uniform noise. Recall@k is the fraction of the flat
+index's top-k ids that each index returns.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import index_factory
+from modules.index_factory import build_index, configure_search, normalize
+
+
+def synthetic_vectors(n, dim, clusters=200, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dim)).astype("float32")
+    labels = rng.integers(0, clusters, size=n)
+    return centres[labels] + 0.5 * rng.normal(size=(n, dim)).astype("float32")
+
+
+def pdf_vectors(path, chunk_size=500, overlap=100):
+    from modules.pdf_processor import extract_text_from_pdf
+    from modules.vector_store import get_embedder
+
+    text = extract_text_from_pdf(open(path, "rb"))
+    chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size - overlap)]
+    return np.asarray(get_embedder().encode(chunks, batch_size=64), dtype="float32")
+
+
+def index_bytes(index):
+    return len(faiss.serialize_index(index))
+
+
+def measure(index, queries, k):
+    latencies = []
+    ids = []
+    for q in queries:
+        start = time.perf_counter()
+        _, I = index.search(q.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids.append(I[0])
+    return np.array(ids), np.array(latencies)
+
+
+def recall(found, truth):
+    hits = sum(len(set(f[f >= 0]) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--pdf", help="embed this PDF's chunks instead of synthetic vectors")
+    args = parser.parse_args()
+
+    # Keep benchmark quantizers out of the app cache
+    index_factory.QUANTIZER_DIR = tempfile.mkdtemp(prefix="bench_quantizers_")
+
+    data = pdf_vectors(args.pdf) if args.pdf else synthetic_vectors(args.vectors, args.dim)
+    rng = np.random.default_rng(1)
+    queries = normalize(data[rng.choice(len(data), size=min(args.queries, len(data)), replace=False)]
+                        + 0.1 * rng.normal(size=(min(args.queries, len(data)), data.shape[1])))
+    print(f"{len(data)} vectors, dim {data.shape[1]}, {len(queries)} queries, k={args.k}\n")
+
+    runs = [
+        ("flat", {"type": "flat"}, [None]),
+        ("hnsw", {"type": "hnsw"}, [("ef_search", v) for v in (16, 32, 64, 128)]),
+        ("ivfpq", {"type": "ivfpq", "retrain": True}, [("nprobe", v) for v in (4, 16, 64)]),
+        ("ivfpq", {"type": "ivfpq", "refine": ""}, [("nprobe", v) for v in (16,)]),
+    ]
+
+    truth = None
+    print(f"{'index':<8}{'param':<16}{'build s':>9}{'MB':>9}{'recall':>9}{'p50 ms':>9}{'p95 ms':>9}")
+    for name, config, sweeps in runs:
+        start = time.perf_counter()
+        try:
+            index, resolved = build_index(data, config)
+        except Exception as e:
+            print(f"{name:<8}skipped: {e}")
+            continue
+        build_seconds = time.perf_counter() - start
+        size_mb = index_bytes(index) / 1e6
+
+        for sweep in sweeps:
+            label = "-"
+            if sweep is not None:
+                key, value = sweep
+                configure_search(index, {**resolved, key: value})
+                label = f"{key}={value}"
+
+            found, latencies = measure(index, queries, args.k)
+            if truth is None:
+                truth = found
+            print(f"{resolved['type']:<8}{label:<16}{build_seconds:>9.2f}{size_mb:>9.1f}"
+                  f"{recall(found, truth):>9.3f}{np.percentile(latencies, 50):>9.3f}"
+                  f"{np.percentile(latencies, 95):>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
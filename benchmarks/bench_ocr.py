@@ -0,0 +1,61 @@
+"""
+OCR throughput of modules.ocr for increasing worker process counts.
+
+    python -m benchmarks.bench_ocr scanned.pdf --pages 24 --workers 1 2 4 8
+    python -m benchmarks.bench_ocr scanned.pdf --workers 4 --dpi 200 auto
+
+Each run starts a fresh pool and OCRs the same pages; pool start-up is
+excluded so the numbers reflect steady-state pages per second. The OCR page
+cache is disabled so every run does the full work.
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["OCR_CACHE_MAX_BYTES"] = "0"
+
+from modules import ocr
+
+
+def run(pdf_path, pages, workers, dpi):
+    ocr.OCR_WORKERS = workers
+    ocr.OCR_MAX_IN_FLIGHT = 2 * workers
+    pool = ocr._get_ocr_pool()
+    # Workers start on demand; get them all running before timing
+    list(pool.map(abs, range(4 * workers)))
+
+    start = time.perf_counter()
+    results = [result for _, result in ocr.iter_ocr_pages(pdf_path, pages, dpi=dpi)]
+    seconds = time.perf_counter() - start
+
+    ocr._discard_ocr_pool(pool)
+    return seconds, ocr._ocr_report(results, len(pages))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf")
+    parser.add_argument("--pages", type=int, default=24)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 4])
+    parser.add_argument("--dpi", nargs="+", default=["auto"], help='render DPIs to compare; "auto" is adaptive')
+    args = parser.parse_args()
+
+    total = ocr.pdfinfo_from_path(args.pdf, poppler_path=ocr.POPPLER_BIN_PATH)["Pages"]
+    pages = list(range(1, min(args.pages, total) + 1))
+
+    print(f"{'dpi':>6} {'workers':>8} {'seconds':>9} {'pages/s':>9} {'speedup':>8} {'confidence':>11} {'fallbacks':>10}")
+    baseline = None
+    for dpi in args.dpi:
+        dpi = dpi if dpi == "auto" else int(dpi)
+        for workers in args.workers:
+            seconds, report = run(args.pdf, pages, workers, dpi)
+            rate = len(pages) / seconds
+            baseline = baseline or rate
+            print(f"{dpi:>6} {workers:>8} {seconds:>9.2f} {rate:>9.2f} {rate / baseline:>7.2f}x "
+                  f"{report['mean_confidence'] or 0:>11.3f} {report['fallback_pages']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,8 +5,9 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 
-from routes import chat, pdf, health
+from routes import chat, pdf, health, corpus
 from services.pdf_service import initialize_models
+from modules.keyword_meaning import seed_glossary_from_env
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -33,11 +34,13 @@ async def startup_event():
     logger.info("Loading AI models...")
     initialize_models()
     logger.info("Models loaded successfully!")
+    seed_glossary_from_env()
 
 # Include routers
 app.include_router(health.router, tags=["Health"])
 app.include_router(pdf.router, prefix="/pdf", tags=["PDF"])
 app.include_router(chat.router, prefix="/chat", tags=["Chat"])
+app.include_router(corpus.router, prefix="/corpus", tags=["Corpus"])
 
 if __name__ == "__main__":
     import uvicorn
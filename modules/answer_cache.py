@@ -0,0 +1,148 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from modules.persistent_cache import register_cache
+
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.9"))
+ANSWER_CACHE_MAX_PER_DOCUMENT = int(os.getenv("ANSWER_CACHE_MAX_PER_DOCUMENT", "200"))
+ANSWER_CACHE_MAX_DOCUMENTS = int(os.getenv("ANSWER_CACHE_MAX_DOCUMENTS", "500"))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(24 * 3600)))
+
+
+class SemanticAnswerCache:
+    """
+    Per-document cache of chat answers, looked up by query embedding.
+
+    A question whose (normalized) embedding has cosine similarity of at least
+    `threshold` with a cached question for the same document gets the cached
+    answer. Each document keeps at most `max_per_document` answers (least
+    recently used dropped first), at most `max_documents` documents are kept,
+    and answers expire after `ttl_seconds`. Keys may be scoped as
+    "<document>:<scope>" (e.g. per retrieval mode); invalidating a document
+    drops all of its scopes.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD,
+                 max_per_document: int = ANSWER_CACHE_MAX_PER_DOCUMENT,
+                 max_documents: int = ANSWER_CACHE_MAX_DOCUMENTS,
+                 ttl_seconds: Optional[float] = ANSWER_CACHE_TTL_SECONDS):
+        self.threshold = threshold
+        self.max_per_document = max_per_document
+        self.max_documents = max_documents
+        self.ttl_seconds = ttl_seconds
+
+        # doc key -> {"vectors": (n, d) float32, "entries": [{"payload", "created_at", "used_at"}]}
+        self._docs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _drop_entries(self, doc: Dict[str, Any], keep: List[int]) -> None:
+        self.evictions += len(doc["entries"]) - len(keep)
+        doc["entries"] = [doc["entries"][i] for i in keep]
+        doc["vectors"] = doc["vectors"][keep]
+
+    def _expire(self, doc: Dict[str, Any], now: float) -> None:
+        if self.ttl_seconds is None:
+            return
+        keep = [i for i, e in enumerate(doc["entries"]) if now - e["created_at"] <= self.ttl_seconds]
+        if len(keep) != len(doc["entries"]):
+            self._drop_entries(doc, keep)
+
+    def _best_match(self, doc: Dict[str, Any], query_vec: np.ndarray) -> Tuple[int, float]:
+        if not doc["entries"]:
+            return -1, 0.0
+        sims = doc["vectors"] @ query_vec
+        best = int(np.argmax(sims))
+        return best, float(sims[best])
+
+    def lookup(self, doc_key: str, query_vec: np.ndarray) -> Optional[Tuple[Dict[str, Any], float]]:
+        """(payload, similarity) of the closest cached question, if similar enough."""
+        now = time.time()
+        with self._lock:
+            doc = self._docs.get(doc_key)
+            if doc is not None:
+                self._expire(doc, now)
+                best, similarity = self._best_match(doc, query_vec)
+                if best >= 0 and similarity >= self.threshold:
+                    doc["entries"][best]["used_at"] = now
+                    self._docs.move_to_end(doc_key)
+                    self.hits += 1
+                    return doc["entries"][best]["payload"], similarity
+
+            self.misses += 1
+            return None
+
+    def store(self, doc_key: str, query_vec: np.ndarray, payload: Dict[str, Any]) -> None:
+        now = time.time()
+        query_vec = np.asarray(query_vec, dtype="float32").reshape(1, -1)
+        entry = {"payload": payload, "created_at": now, "used_at": now}
+
+        with self._lock:
+            doc = self._docs.get(doc_key)
+            if doc is None:
+                doc = {"vectors": np.zeros((0, query_vec.shape[1]), dtype="float32"), "entries": []}
+                self._docs[doc_key] = doc
+            self._docs.move_to_end(doc_key)
+            self._expire(doc, now)
+
+            best, similarity = self._best_match(doc, query_vec[0])
+            if best >= 0 and similarity >= self.threshold:
+                # Same question asked again after a miss race: refresh it in place
+                doc["entries"][best] = entry
+                doc["vectors"][best] = query_vec[0]
+            else:
+                doc["entries"].append(entry)
+                doc["vectors"] = np.vstack([doc["vectors"], query_vec])
+
+            if len(doc["entries"]) > self.max_per_document:
+                by_use = sorted(range(len(doc["entries"])), key=lambda i: doc["entries"][i]["used_at"])
+                self._drop_entries(doc, sorted(by_use[-self.max_per_document:]))
+
+            while len(self._docs) > self.max_documents:
+                _, dropped = self._docs.popitem(last=False)
+                self.evictions += len(dropped["entries"])
+
+    def invalidate(self, doc_key: str) -> int:
+        """Drop every answer cached for `doc_key` and its scoped keys. Returns the number dropped."""
+        with self._lock:
+            keys = [k for k in self._docs if k == doc_key or k.startswith(f"{doc_key}:")]
+            dropped = sum(len(self._docs.pop(k)["entries"]) for k in keys)
+            self.evictions += dropped
+            return dropped
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": sum(len(d["entries"]) for d in self._docs.values()),
+                "documents": len(self._docs),
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+_ANSWER_CACHE: Optional[SemanticAnswerCache] = None
+
+
+def document_key(session_id: str, content_sha256: Optional[str] = None) -> str:
+    """Cache key of a document session; the content hash lets re-uploads of the same PDF share answers."""
+    return content_sha256 or session_id
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    global _ANSWER_CACHE
+    if _ANSWER_CACHE is None:
+        _ANSWER_CACHE = SemanticAnswerCache()
+        register_cache("chat_answers", _ANSWER_CACHE)
+    return _ANSWER_CACHE
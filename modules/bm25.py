@@ -0,0 +1,123 @@
+import re
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Numbers are kept: statutory references ("Section 138", "Order XXXIX Rule 1") hinge on them
+_TERM_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TERM_RE.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed list of chunks, with CSR-style postings:
+
+        indptr[t]:indptr[t+1]   slice of `postings` / `tfs` for term id t
+        postings                chunk ids (int32), sorted within each term
+        tfs                     term frequency in that chunk (uint16)
+
+    A query touches only the posting slices of its own terms.
+    """
+
+    def __init__(self, vocab: Dict[str, int], indptr: np.ndarray, postings: np.ndarray,
+                 tfs: np.ndarray, doc_len: np.ndarray, build_seconds: float = 0.0):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.postings = postings
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.build_seconds = build_seconds
+
+        n_docs = len(doc_len)
+        self.avgdl = float(doc_len.mean()) if n_docs else 0.0
+        df = np.diff(indptr).astype("float32")
+        self.idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5)).astype("float32")
+        # Per-chunk length normalisation, computed once
+        self._norm = (BM25_K1 * (1 - BM25_B + BM25_B * doc_len / max(self.avgdl, 1e-9))).astype("float32")
+
+    @classmethod
+    def build(cls, texts: List[str]) -> "BM25Index":
+        start = time.perf_counter()
+        vocab: Dict[str, int] = {}
+        term_ids: List[int] = []
+        doc_ids: List[int] = []
+        counts: List[int] = []
+        doc_len = np.zeros(len(texts), dtype="float32")
+
+        for doc, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_len[doc] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                doc_ids.append(doc)
+                counts.append(tf)
+
+        term_arr = np.asarray(term_ids, dtype="int64")
+        order = np.argsort(term_arr, kind="stable")  # stable keeps chunk ids sorted per term
+        indptr = np.zeros(len(vocab) + 1, dtype="int64")
+        np.cumsum(np.bincount(term_arr, minlength=len(vocab)), out=indptr[1:])
+
+        postings = np.asarray(doc_ids, dtype="int32")[order]
+        tfs = np.minimum(np.asarray(counts, dtype="int64"), np.iinfo(np.uint16).max).astype("uint16")[order]
+
+        return cls(vocab, indptr, postings, tfs, doc_len, build_seconds=time.perf_counter() - start)
+
+    def search(self, query: str, top_k: int) -> List[Tuple[int, float]]:
+        """(chunk id, BM25 score) pairs, best first; chunks matching no query term are omitted."""
+        n_docs = len(self.doc_len)
+        if not n_docs:
+            return []
+
+        scores = np.zeros(n_docs, dtype="float32")
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            lo, hi = self.indptr[term_id], self.indptr[term_id + 1]
+            docs = self.postings[lo:hi]
+            tf = self.tfs[lo:hi].astype("float32")
+            # Each chunk appears once per term, so plain fancy-index addition is safe
+            scores[docs] += self.idf[term_id] * tf * (BM25_K1 + 1) / (tf + self._norm[docs])
+
+        top_k = min(top_k, n_docs)
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        candidates = candidates[np.argsort(-scores[candidates])]
+        return [(int(i), float(scores[i])) for i in candidates if scores[i] > 0]
+
+    def memory_bytes(self) -> int:
+        arrays = (self.indptr, self.postings, self.tfs, self.doc_len, self.idf, self._norm)
+        vocab_bytes = sum(len(term) + 8 for term in self.vocab)
+        return sum(a.nbytes for a in arrays) + vocab_bytes
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "chunks": len(self.doc_len),
+            "terms": len(self.vocab),
+            "postings": len(self.postings),
+            "memory_bytes": self.memory_bytes(),
+            "build_seconds": round(self.build_seconds, 4),
+        }
+
+    # ---- persistence ----
+    def save(self, path: str) -> None:
+        # Terms are [a-z0-9]+, so newline-joining them is lossless
+        terms = "\n".join(sorted(self.vocab, key=self.vocab.get))
+        with open(path, "wb") as f:
+            np.savez(f, terms=np.array(terms), indptr=self.indptr, postings=self.postings,
+                     tfs=self.tfs, doc_len=self.doc_len, build_seconds=np.array(self.build_seconds))
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with np.load(path) as data:
+            joined = str(data["terms"])
+            terms = joined.split("\n") if joined else []
+            return cls({term: i for i, term in enumerate(terms)}, data["indptr"], data["postings"],
+                       data["tfs"], data["doc_len"], build_seconds=float(data["build_seconds"]))
@@ -6,14 +6,31 @@ import os
 import json
 import logging
 import re
-import time
-from typing import Dict, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 from groq import Groq
 
+from modules.persistent_cache import PersistentCache
+from modules.rate_limiter import get_groq_limiter, estimate_tokens
+
 logging.basicConfig(level=logging.INFO)
 
 client = Groq(api_key=os.getenv("GROQ_API_KEY"))
 
+LAW_MODEL = "llama-3.1-8b-instant"
+LAW_MAX_TOKENS = 300
+BATCH_TOKENS_PER_KEYWORD = 120  # Completion budget per keyword in batched mode
+
+LAW_TYPES = ("criminal", "civil", "rent", "property", "contract", "consumer", "general")
+
+# Bump when the section prompt changes so older answers are not reused
+IPC_PROMPT_VERSION = "ipc-v2"
+IPC_CACHE_MAX_ENTRIES = int(os.getenv("IPC_CACHE_MAX_ENTRIES", "50000"))
+IPC_CACHE_TTL_DAYS = float(os.getenv("IPC_CACHE_TTL_DAYS", "90"))
+CASE_LAW_MAX_WORKERS = int(os.getenv("CASE_LAW_MAX_WORKERS", "5"))
+
+_IPC_CACHE: Optional[PersistentCache] = None
+
 
 def normalize_keyword(keyword: str):
     """
@@ -35,25 +52,42 @@ def normalize_keyword(keyword: str):
     return keyword
 
 
-def get_ipc_section_for_keyword(keyword: str) -> Dict:
-    """
-    Uses LLM to identify the most relevant legal section for a keyword.
-    Returns structured JSON (section, category, summary)
-    """
+def get_ipc_cache() -> PersistentCache:
+    """Persistent keyword -> legal section cache shared across uploads and workers."""
+    global _IPC_CACHE
+    if _IPC_CACHE is None:
+        _IPC_CACHE = PersistentCache(
+            "ipc_sections",
+            max_entries=IPC_CACHE_MAX_ENTRIES,
+            ttl_seconds=IPC_CACHE_TTL_DAYS * 86400
+        )
+    return _IPC_CACHE
+
 
+def _clean_keyword(keyword: str) -> str:
     cleaned = normalize_keyword(keyword)
 
     if not cleaned:
         logging.warning(f"Keyword '{keyword}' became invalid after cleaning.")
         cleaned = keyword
 
-    prompt = f"""
-You are a senior Indian legal expert.
+    return cleaned
 
-For the keyword: "{cleaned}"
 
-Identify the MOST relevant Indian law section.
+def _ipc_cache_key(cleaned: str) -> str:
+    return f"{IPC_PROMPT_VERSION}:{LAW_MODEL}:{cleaned}"
+
+
+def _fallback_section(keyword: str) -> Dict:
+    return {
+        "keyword": keyword,
+        "ipc_section": "General Legal Term",
+        "case_category": "general",
+        "summary": "No specific section identified."
+    }
 
+
+SECTION_GUIDELINES = """
 Prefer:
 - Indian Penal Code (IPC)
 - Transfer of Property Act
@@ -68,47 +102,155 @@ Rules:
 - ONLY provide real Indian legal acts
 - If unsure, choose the safest commonly applicable section
 - Return STRICT JSON ONLY
+"""
+
+
+def _parse_section_entry(cleaned: str, entry) -> Optional[Dict]:
+    """Validate one LLM section entry; returns None if it is malformed."""
+    if not isinstance(entry, dict):
+        return None
+
+    section = entry.get("section")
+    summary = entry.get("summary")
+    if not isinstance(section, str) or not section.strip():
+        return None
+    if not isinstance(summary, str) or not summary.strip():
+        return None
+
+    law_type = str(entry.get("law_type", "general")).strip().lower()
+    if law_type not in LAW_TYPES:
+        law_type = "general"
+
+    return {
+        "keyword": cleaned,
+        "ipc_section": section.strip(),
+        "case_category": law_type,
+        "summary": summary.strip()
+    }
+
+
+def _fetch_ipc_section(cleaned: str) -> Dict:
+    """
+    Ask the LLM for the most relevant legal section of an already-cleaned keyword.
+    Raises on API or parse errors so failures are never cached.
+    """
+    prompt = f"""
+You are a senior Indian legal expert.
+
+For the keyword: "{cleaned}"
 
+Identify the MOST relevant Indian law section.
+{SECTION_GUIDELINES}
 Respond in this format ONLY:
 
 {{
  "section": "Act Name Section Number",
- "law_type": "criminal | civil | rent | property | contract | consumer | general",
+ "law_type": "{' | '.join(LAW_TYPES)}",
  "summary": "short 1-2 line meaning of this section"
 }}
 """
 
-    try:
-        response = client.chat.completions.create(
-            model="llama-3.1-8b-instant",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.1,
-            max_tokens=300
-        )
+    get_groq_limiter().acquire(estimate_tokens(prompt, LAW_MAX_TOKENS))
+
+    response = client.chat.completions.create(
+        model=LAW_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.1,
+        max_tokens=LAW_MAX_TOKENS,
+        response_format={"type": "json_object"}
+    )
+
+    law_info = _parse_section_entry(cleaned, json.loads(response.choices[0].message.content))
+    if law_info is None:
+        raise ValueError(f"Malformed section response for '{cleaned}'")
+
+    return law_info
+
+
+def fetch_ipc_sections_batch(cleaned_keywords: List[str]) -> Dict[str, Dict]:
+    """
+    Map several cleaned keywords to legal sections with ONE JSON-mode request.
+    Only entries that pass validation are returned; callers fall back per keyword
+    for anything missing. Raises on API or JSON decode errors.
+    """
+    if not cleaned_keywords:
+        return {}
+
+    keyword_lines = "\n".join(f'- "{kw}"' for kw in cleaned_keywords)
+    prompt = f"""
+You are a senior Indian legal expert.
+
+For EACH keyword below, identify the MOST relevant Indian law section.
+
+Keywords:
+{keyword_lines}
+{SECTION_GUIDELINES}
+Respond with ONE JSON object whose keys are the keywords exactly as given:
+
+{{
+ "<keyword>": {{
+   "section": "Act Name Section Number",
+   "law_type": "{' | '.join(LAW_TYPES)}",
+   "summary": "short 1-2 line meaning of this section"
+ }}
+}}
+"""
+
+    max_tokens = BATCH_TOKENS_PER_KEYWORD * len(cleaned_keywords) + 50
+    get_groq_limiter().acquire(estimate_tokens(prompt, max_tokens))
+
+    response = client.chat.completions.create(
+        model=LAW_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.1,
+        max_tokens=max_tokens,
+        response_format={"type": "json_object"}
+    )
+
+    data = json.loads(response.choices[0].message.content)
+    if not isinstance(data, dict):
+        raise ValueError("Batched section response is not a JSON object")
+
+    # The model sometimes changes case/whitespace of the keys
+    entries = {" ".join(str(k).lower().split()): v for k, v in data.items()}
 
-        data = json.loads(response.choices[0].message.content)
+    results = {}
+    for kw in cleaned_keywords:
+        law_info = _parse_section_entry(kw, entries.get(" ".join(kw.lower().split())))
+        if law_info is None:
+            logging.warning(f"Malformed or missing batched entry for '{kw}', will retry individually")
+            continue
+        results[kw] = law_info
+
+    return results
+
+
+def get_ipc_section_for_keyword(keyword: str) -> Dict:
+    """
+    Uses LLM to identify the most relevant legal section for a keyword.
+    Answers are memoized on the normalized keyword.
+    Returns structured JSON (section, category, summary)
+    """
+    cleaned = _clean_keyword(keyword)
 
-        ipc_section = data.get("section", "General Legal Term")
-        category = data.get("law_type", "general")
-        summary = data.get("summary", "Relevant legal section.")
+    cached = get_ipc_cache().get(_ipc_cache_key(cleaned))
+    if cached is not None:
+        return cached
 
-        logging.info(f"Mapped '{keyword}' → {ipc_section}")
+    return _lookup_and_cache(cleaned)
 
-        return {
-            "keyword": cleaned,
-            "ipc_section": ipc_section,
-            "case_category": category,
-            "summary": summary
-        }
+
+def _lookup_and_cache(cleaned: str) -> Dict:
+    """Fetch a section for a cache miss and store it; failures return the fallback uncached."""
+    try:
+        law_info = _fetch_ipc_section(cleaned)
+        logging.info(f"Mapped '{cleaned}' → {law_info['ipc_section']}")
+        get_ipc_cache().set(_ipc_cache_key(cleaned), law_info)
+        return law_info
 
     except Exception as e:
         logging.error(f"Error mapping keyword: {e}")
-        return {
-            "keyword": keyword,
-            "ipc_section": "General Legal Term",
-            "case_category": "general",
-            "summary": "No specific section identified."
-        }
+        return _fallback_section(cleaned)
 
 
 def build_kanoon_link(ipc_section: str):
@@ -119,14 +261,9 @@ def build_kanoon_link(ipc_section: str):
     return f"https://indiankanoon.org/search/?formInput={query}"
 
 
-def get_case_law_for_keyword(keyword: str) -> Tuple[Dict, str]:
-    """
-    Identify IPC/Act + Build Kanoon Link + Summary
-    Returns JSON + UI string
-    """
-
-    law_info = get_ipc_section_for_keyword(keyword)
-
+def _build_case_law(law_info: Dict) -> Tuple[Dict, str]:
+    """Attach the Kanoon link and UI text to a section lookup result."""
+    law_info = dict(law_info)
     law_info["search_query"] = law_info["ipc_section"].replace(" ", "+")
     law_info["kanoon_link"] = build_kanoon_link(law_info["ipc_section"])
 
@@ -139,9 +276,21 @@ IndianKanoon Link: {law_info['kanoon_link']}"""
     return law_info, ui_output
 
 
+def get_case_law_for_keyword(keyword: str) -> Tuple[Dict, str]:
+    """
+    Identify IPC/Act + Build Kanoon Link + Summary
+    Returns JSON + UI string
+    """
+
+    return _build_case_law(get_ipc_section_for_keyword(keyword))
+
+
 def get_cases_for_keywords(keywords: list) -> Dict[str, Tuple[Dict, str]]:
     """
     Fetch case law links for multiple keywords.
+    Cached keywords are answered locally; misses are resolved with one batched
+    request, and any malformed entries are retried concurrently one by one
+    under the shared Groq rate limiter.
     Returns: Dict mapping keyword -> (json_output, ui_output)
     """
 
@@ -149,17 +298,37 @@ def get_cases_for_keywords(keywords: list) -> Dict[str, Tuple[Dict, str]]:
         logging.warning("No keywords provided for case law fetching")
         return {}
 
-    results = {}
-
     logging.info(f"Starting case law fetch for {len(keywords)} keywords: {keywords}")
 
-    for i, keyword in enumerate(keywords, 1):
-        logging.info(f"Processing keyword {i}/{len(keywords)}: {keyword}")
+    cleaned = {keyword: _clean_keyword(keyword) for keyword in keywords}
+    sections = get_ipc_cache().get_many(_ipc_cache_key(c) for c in cleaned.values())
+
+    misses = [c for c in dict.fromkeys(cleaned.values()) if _ipc_cache_key(c) not in sections]
+    logging.info(f"Section cache: {len(cleaned) - len(misses)} hits, {len(misses)} misses")
+
+    # One batched request for all misses, then per-keyword fallback for bad entries
+    if len(misses) > 1:
+        try:
+            batched = fetch_ipc_sections_batch(misses)
+        except Exception as e:
+            logging.error(f"Batched section lookup failed, falling back per keyword: {e}")
+            batched = {}
+
+        get_ipc_cache().set_many({_ipc_cache_key(kw): info for kw, info in batched.items()})
+        for kw, law_info in batched.items():
+            sections[_ipc_cache_key(kw)] = law_info
+        misses = [kw for kw in misses if kw not in batched]
 
+    if misses:
+        with ThreadPoolExecutor(max_workers=min(CASE_LAW_MAX_WORKERS, len(misses))) as executor:
+            for miss, law_info in zip(misses, executor.map(_lookup_and_cache, misses)):
+                sections[_ipc_cache_key(miss)] = law_info
+
+    results = {}
+    for keyword in keywords:
         try:
-            json_output, ui_output = get_case_law_for_keyword(keyword)
-            results[keyword] = (json_output, ui_output)
-            logging.info(f"Successfully processed '{keyword}'")
+            law_info = sections[_ipc_cache_key(cleaned[keyword])]
+            results[keyword] = _build_case_law(law_info)
 
         except Exception as e:
             logging.error(f"Failed to process '{keyword}': {e}")
@@ -168,8 +337,5 @@ def get_cases_for_keywords(keywords: list) -> Dict[str, Tuple[Dict, str]]:
                 f"Keyword: {keyword}\nError occurred while processing."
             )
 
-        if i < len(keywords):
-            time.sleep(0.5)
-
     logging.info(f"Case law processing complete. Retrieved {len(results)} results.")
-    return results
\ No newline at end of file
+    return results
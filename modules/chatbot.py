@@ -1,15 +1,14 @@
 import os
+import time
 from groq import Groq
-from modules.vector_store import search_similar_chunks
+from modules.vector_store import search_similar_chunks, hybrid_search
 
 client = Groq(api_key=os.getenv("GROQ_API_KEY"))
 
-def answer_query_with_context(query, index, chunks):
-    """Use FAISS + Llama to answer based on document content."""
-    context_chunks = search_similar_chunks(query, index, chunks)
-    context = "\n\n".join(context_chunks)
+CHAT_MODEL = "llama-3.1-8b-instant"
 
-    prompt = f"""
+def _build_prompt(query, context):
+    return f"""
 You are a legal assistant. Use the following context to answer the user question.
 If the answer is not in the document, say "The document does not contain that information."
 
@@ -20,9 +19,72 @@ Question: {query}
 Answer (in 2-3 concise sentences):
 """
 
+def _answer_from_context(query, context):
     response = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        messages=[{"role": "user", "content": prompt}]
+        model=CHAT_MODEL,
+        messages=[{"role": "user", "content": _build_prompt(query, context)}]
     )
 
     return response.choices[0].message.content.strip()
+
+def stream_answer_from_context(query, context):
+    """Yield answer text pieces as Groq generates them."""
+    stream = client.chat.completions.create(
+        model=CHAT_MODEL,
+        messages=[{"role": "user", "content": _build_prompt(query, context)}],
+        stream=True
+    )
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
+
+def answer_query_with_context(query, index, chunks):
+    """Use FAISS + Llama to answer based on document content."""
+    context_chunks = search_similar_chunks(query, index, chunks)
+    context = "\n\n".join(context_chunks)
+    return _answer_from_context(query, context)
+
+def answer_query_with_sources(query, index, chunks, chunk_meta=None, top_k=3, bm25=None, mode=None,
+                              query_vec=None):
+    """
+    Answer from one document's indexes using `mode` retrieval ("vector",
+    "bm25" or "hybrid"). Returns (answer, sources, retrieval stats) where
+    sources give the page and character span of each chunk used, when known.
+    """
+    context, sources, retrieval = retrieve_document_context(query, index, chunks, chunk_meta, top_k, bm25, mode,
+                                                            query_vec=query_vec)
+    return _answer_from_context(query, context), sources, retrieval
+
+def retrieve_document_context(query, index, chunks, chunk_meta=None, top_k=3, bm25=None, mode=None,
+                              query_vec=None):
+    """Retrieval half of answer_query_with_sources. Returns (context, sources, retrieval stats)."""
+    hits, retrieval = hybrid_search(query, index, len(chunks), bm25=bm25, top_k=top_k, mode=mode,
+                                    query_vec=query_vec)
+    context = "\n\n".join(chunks[i] for i, _ in hits)
+
+    sources = [{**chunk_meta[i], "score": round(score, 4)} for i, score in hits] if chunk_meta else []
+    return context, sources, retrieval
+
+def _source_label(hit):
+    label = hit.get("filename") or hit["doc_id"]
+    if hit.get("page") is not None:
+        label += f", page {hit['page']}"
+    return label
+
+def answer_query_over_corpus(query, corpus_id, top_k=5):
+    """Answer from the most relevant chunks across a corpus. Returns (answer, sources)."""
+    context, sources, _ = retrieve_corpus_context(query, corpus_id, top_k)
+    return _answer_from_context(query, context), sources
+
+def retrieve_corpus_context(query, corpus_id, top_k=5):
+    """Retrieval half of answer_query_over_corpus. Returns (context, sources, retrieval stats)."""
+    start = time.perf_counter()
+    hits = search_similar_chunks(query, top_k=top_k, corpus_id=corpus_id)
+    retrieval = {"mode": "vector", "vector_ms": round((time.perf_counter() - start) * 1000, 2)}
+    context = "\n\n".join(f"[{_source_label(h)}]\n{h['text']}" for h in hits)
+
+    sources = [{k: h[k] for k in ("doc_id", "filename", "page", "start", "end", "score")} for h in hits]
+    return context, sources, retrieval
@@ -0,0 +1,134 @@
+import os
+import re
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+
+from modules.pdf_processor import split_into_paragraphs
+
+# MiniLM truncates input at 256 word pieces; stay safely below it
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "200"))
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_END_RE = re.compile(r"(?<=[.;:!?])\s+")
+_WORD_RE = re.compile(r"\S+")
+_CLOSING_CHARS = ".;:!?\"')]"
+
+Span = Tuple[int, int]
+
+
+def count_tokens(text: str) -> int:
+    """Cheap word-piece estimate: words and punctuation marks."""
+    return len(_TOKEN_RE.findall(text))
+
+
+def _paragraph_spans(text: str) -> List[Span]:
+    """
+    Character spans covering `text`, one per paragraph from split_into_paragraphs.
+    Text the splitter drops stays attached: closing punctuation to its own
+    paragraph, short fragments such as headings to the paragraph after them.
+    """
+    ends = []
+    cursor = 0
+    for para in split_into_paragraphs(text):
+        pos = text.find(para, cursor)
+        if pos < 0:
+            continue
+        cursor = pos + len(para)
+        while cursor < len(text) and text[cursor] in _CLOSING_CHARS:
+            cursor += 1
+        ends.append(cursor)
+
+    if not ends:
+        return [(0, len(text))] if text.strip() else []
+
+    ends[-1] = len(text)
+    starts = [0] + ends[:-1]
+    return list(zip(starts, ends))
+
+
+def _split_oversized(text: str, start: int, end: int, max_tokens: int) -> List[Span]:
+    """Split a span on sentence boundaries, then on words if a sentence is still too long."""
+    sentences = []
+    cursor = start
+    for match in _SENTENCE_END_RE.finditer(text, start, end):
+        sentences.append((cursor, match.start()))
+        cursor = match.end()
+    sentences.append((cursor, end))
+
+    pieces = []
+    for s_start, s_end in sentences:
+        if count_tokens(text[s_start:s_end]) <= max_tokens:
+            pieces.append((s_start, s_end))
+            continue
+
+        piece_start, tokens = None, 0
+        for word in _WORD_RE.finditer(text, s_start, s_end):
+            word_tokens = count_tokens(word.group())
+            if piece_start is not None and tokens + word_tokens > max_tokens:
+                pieces.append((piece_start, prev_end))
+                piece_start, tokens = None, 0
+            if piece_start is None:
+                piece_start = word.start()
+            tokens += word_tokens
+            prev_end = word.end()
+        if piece_start is not None:
+            pieces.append((piece_start, prev_end))
+
+    return pieces
+
+
+def _page_of(offset: int, page_starts: Optional[List[int]]) -> Optional[int]:
+    if not page_starts:
+        return None
+    return max(1, bisect_right(page_starts, offset))
+
+
+def chunk_document(text: str, page_starts: Optional[List[int]] = None,
+                   max_tokens: int = CHUNK_MAX_TOKENS) -> List[Dict]:
+    """
+    Pack whole paragraphs (or sentences of over-long paragraphs) into chunks
+    of at most `max_tokens`, without overlap.
+
+    Returns dicts with "text", "start"/"end" character offsets into `text`,
+    "page"/"page_end" (1-based, from page_starts as returned by join_pages)
+    and "tokens".
+    """
+    units: List[Tuple[int, int, int]] = []
+    for start, end in _paragraph_spans(text):
+        tokens = count_tokens(text[start:end])
+        if tokens <= max_tokens:
+            units.append((start, end, tokens))
+        else:
+            units.extend((s, e, count_tokens(text[s:e])) for s, e in _split_oversized(text, start, end, max_tokens))
+
+    chunks = []
+
+    def emit(start: int, end: int, tokens: int):
+        piece = text[start:end]
+        stripped = piece.strip()
+        if not stripped:
+            return
+        start += len(piece) - len(piece.lstrip())
+        end = start + len(stripped)
+        chunks.append({
+            "text": stripped,
+            "start": start,
+            "end": end,
+            "page": _page_of(start, page_starts),
+            "page_end": _page_of(end - 1, page_starts),
+            "tokens": tokens,
+        })
+
+    current_start, current_end, current_tokens = None, 0, 0
+    for start, end, tokens in units:
+        if current_start is not None and current_tokens + tokens > max_tokens:
+            emit(current_start, current_end, current_tokens)
+            current_start, current_tokens = None, 0
+        if current_start is None:
+            current_start = start
+        current_end = end
+        current_tokens += tokens
+    if current_start is not None:
+        emit(current_start, current_end, current_tokens)
+
+    return chunks
@@ -7,3 +7,6 @@ load_dotenv()
 # API Keys
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+
+# Local cache directory for persistent caches (LLM results, embeddings, OCR)
+CACHE_DIR = os.getenv("LAWLENS_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "lawlens"))
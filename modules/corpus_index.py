@@ -0,0 +1,323 @@
+import os
+import re
+import json
+import time
+import fcntl
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import faiss
+import numpy as np
+
+from modules.config import CACHE_DIR
+from modules.index_factory import normalize, resolve_index_config, configure_search, load_or_train_ivfpq
+
+logger = logging.getLogger(__name__)
+
+CORPUS_DIR = os.getenv("CORPUS_DIR", os.path.join(CACHE_DIR, "corpora"))
+
+# Exact (flat) search up to this many chunks, then migrate to IVF-PQ
+CORPUS_IVF_MIN_CHUNKS = int(os.getenv("CORPUS_IVF_MIN_CHUNKS", "100000"))
+# IVF-PQ candidates re-ranked exactly against the stored vectors, per requested hit
+CORPUS_RERANK_FACTOR = int(os.getenv("CORPUS_RERANK_FACTOR", "8"))
+# Vectors used to train the IVF-PQ quantizers at migration time
+CORPUS_TRAINING_SAMPLE = int(os.getenv("CORPUS_TRAINING_SAMPLE", "200000"))
+
+_ADD_BATCH = 65536
+_SQL_CHUNK = 500
+
+_CORPUS_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class CorpusIndex:
+    """
+    Incremental multi-document vector index stored under CORPUS_DIR/<corpus_id>:
+
+        meta.sqlite3    documents, per-chunk metadata (doc id, page, offsets, text)
+                        and the index config (query-time settings are not saved by FAISS)
+        vectors.f16     every chunk embedding, float16, row number == chunk id
+        index.faiss     IndexIDMap2(Flat IP) until CORPUS_IVF_MIN_CHUNKS, then IVF-PQ
+        write.lock      flock held by the process changing the corpus
+
+    FAISS ids are chunk ids, so hits map straight back to their metadata.
+    The vector file is memory-mapped: it is used to train the IVF-PQ index on
+    migration and to re-rank IVF-PQ candidates exactly, without holding all
+    embeddings in RAM. Deleting a document removes its ids from the index and
+    its rows from SQLite; its vector rows are left unused.
+
+    Writers in different processes are serialized by write.lock and start from
+    the latest saved index; other workers pick up the saved index on their
+    next call.
+    """
+
+    def __init__(self, corpus_id: str, dim: int, model_id: str, root: str = CORPUS_DIR):
+        if not _CORPUS_ID_RE.match(corpus_id or ""):
+            raise ValueError(f"Invalid corpus id: {corpus_id!r}")
+
+        self.corpus_id = corpus_id
+        self.dim = dim
+        self.model_id = model_id
+        self.dir = os.path.join(root, corpus_id)
+        self.index_path = os.path.join(self.dir, "index.faiss")
+        self.vectors_path = os.path.join(self.dir, "vectors.f16")
+        self.lock_path = os.path.join(self.dir, "write.lock")
+        os.makedirs(self.dir, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(self.dir, "meta.sqlite3"), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " doc_id TEXT PRIMARY KEY,"
+            " filename TEXT,"
+            " n_chunks INTEGER NOT NULL,"
+            " added_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " chunk_id INTEGER PRIMARY KEY,"
+            " doc_id TEXT NOT NULL,"
+            " page INTEGER,"
+            " start_offset INTEGER,"
+            " end_offset INTEGER,"
+            " text TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_doc ON chunks(doc_id)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        self.index_type = "flat"
+        self.index_config: Dict[str, Any] = {"type": "flat"}
+        self._index_mtime = 0.0
+        self._vectors: Optional[np.memmap] = None
+        self._refresh()
+
+    # ---- storage ----
+    def _vector_rows(self) -> int:
+        if not os.path.exists(self.vectors_path):
+            return 0
+        return os.path.getsize(self.vectors_path) // (self.dim * 2)
+
+    def _vector_view(self) -> np.ndarray:
+        rows = self._vector_rows()
+        if self._vectors is None or self._vectors.shape[0] != rows:
+            if rows == 0:
+                return np.zeros((0, self.dim), dtype="float16")
+            self._vectors = np.memmap(self.vectors_path, dtype="float16", mode="r", shape=(rows, self.dim))
+        return self._vectors
+
+    def _save_index(self) -> None:
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        faiss.write_index(self.index, tmp_path)
+        os.replace(tmp_path, self.index_path)
+        self._index_mtime = os.path.getmtime(self.index_path)
+
+    def _refresh(self) -> None:
+        """Reload the index if another worker process saved a newer one."""
+        try:
+            mtime = os.path.getmtime(self.index_path)
+        except OSError:
+            return
+        if mtime <= self._index_mtime:
+            return
+        self.index = faiss.read_index(self.index_path)
+        self.index_type = "flat" if isinstance(faiss.downcast_index(self.index), faiss.IndexIDMap2) else "ivfpq"
+        if self.index_type == "ivfpq":
+            # nprobe is not stored in the index file; without this searches run at nprobe=1
+            self.index_config = self._stored_index_config() or resolve_index_config(
+                int(self.index.ntotal), self.dim, {"type": "ivfpq", "refine": ""})
+            configure_search(self.index, self.index_config)
+        else:
+            self.index_config = {"type": "flat"}
+        self._index_mtime = mtime
+
+    def _stored_index_config(self) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute("SELECT value FROM settings WHERE key = 'index_config'").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _store_index_config(self, config: Dict[str, Any]) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('index_config', ?)",
+                           (json.dumps(config),))
+        self._conn.commit()
+
+    @contextmanager
+    def _writing(self):
+        """Exclusive access across threads and processes, on the latest saved index."""
+        with self._lock, open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # ---- documents ----
+    def add_document(self, doc_id: str, chunks: List[Dict[str, Any]], embeddings,
+                     filename: Optional[str] = None) -> int:
+        """
+        Add (or replace) a document. `chunks` are dicts with "text" and
+        optional "page", "start", "end". Returns the number of chunks added.
+        """
+        vectors = normalize(embeddings)
+        if len(vectors) != len(chunks):
+            raise ValueError("chunks and embeddings differ in length")
+
+        with self._writing():
+            self._remove(doc_id)
+
+            first_id = self._vector_rows()
+            ids = np.arange(first_id, first_id + len(chunks), dtype="int64")
+            with open(self.vectors_path, "ab") as f:
+                f.write(vectors.astype("float16").tobytes())
+
+            self._conn.executemany(
+                "INSERT INTO chunks (chunk_id, doc_id, page, start_offset, end_offset, text) VALUES (?, ?, ?, ?, ?, ?)",
+                [(int(cid), doc_id, c.get("page"), c.get("start"), c.get("end"), c["text"])
+                 for cid, c in zip(ids, chunks)]
+            )
+            self._conn.execute(
+                "INSERT INTO documents (doc_id, filename, n_chunks, added_at) VALUES (?, ?, ?, ?)",
+                (doc_id, filename, len(chunks), time.time())
+            )
+            self._conn.commit()
+
+            self.index.add_with_ids(vectors, ids)
+            if self.index_type == "flat" and self.index.ntotal >= CORPUS_IVF_MIN_CHUNKS:
+                self._migrate_to_ivfpq()
+            self._save_index()
+
+        logger.info(f"Added {len(chunks)} chunks of {doc_id} to corpus {self.corpus_id}")
+        return len(chunks)
+
+    def _remove(self, doc_id: str) -> bool:
+        """Drop a document from the index and SQLite; the caller holds _writing(), commits and saves."""
+        ids = [row[0] for row in self._conn.execute("SELECT chunk_id FROM chunks WHERE doc_id = ?", (doc_id,))]
+        existed = self._conn.execute("SELECT 1 FROM documents WHERE doc_id = ?", (doc_id,)).fetchone() is not None
+        if not existed and not ids:
+            return False
+
+        if ids:
+            self.index.remove_ids(np.array(ids, dtype="int64"))
+        self._conn.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+        self._conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+        logger.info(f"Removed {doc_id} ({len(ids)} chunks) from corpus {self.corpus_id}")
+        return True
+
+    def delete_document(self, doc_id: str) -> bool:
+        with self._writing():
+            removed = self._remove(doc_id)
+            if removed:
+                self._conn.commit()
+                self._save_index()
+        return removed
+
+    def documents(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id, filename, n_chunks, added_at FROM documents ORDER BY added_at").fetchall()
+        return [{"doc_id": d, "filename": f, "chunks": n, "added_at": a} for d, f, n, a in rows]
+
+    # ---- IVF-PQ migration ----
+    def _live_ids(self) -> np.ndarray:
+        ids = [row[0] for row in self._conn.execute("SELECT chunk_id FROM chunks ORDER BY chunk_id")]
+        return np.array(ids, dtype="int64")
+
+    def _migrate_to_ivfpq(self) -> None:
+        """Rebuild the flat index as IVF-PQ, streaming vectors from the memmap."""
+        ids = self._live_ids()
+        vectors = self._vector_view()
+
+        rng = np.random.default_rng(0)
+        sample = ids if len(ids) <= CORPUS_TRAINING_SAMPLE else np.sort(
+            rng.choice(ids, CORPUS_TRAINING_SAMPLE, replace=False))
+        training = np.ascontiguousarray(vectors[sample], dtype="float32")
+
+        # Exact re-ranking against the memmap replaces the refine stage
+        config = resolve_index_config(len(ids), self.dim, {"type": "ivfpq", "refine": ""})
+        started = time.perf_counter()
+        index = load_or_train_ivfpq(training, config, self.model_id)
+
+        for i in range(0, len(ids), _ADD_BATCH):
+            batch = ids[i:i + _ADD_BATCH]
+            index.add_with_ids(np.ascontiguousarray(vectors[batch], dtype="float32"), batch)
+        configure_search(index, config)
+
+        self.index = index
+        self.index_type = "ivfpq"
+        self.index_config = config
+        self._store_index_config(config)
+        logger.info(f"Migrated corpus {self.corpus_id} to IVF-PQ ({len(ids)} chunks) "
+                    f"in {time.perf_counter() - started:.1f}s")
+
+    # ---- search ----
+    def _chunk_metadata(self, ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        meta: Dict[int, Dict[str, Any]] = {}
+        for i in range(0, len(ids), _SQL_CHUNK):
+            part = ids[i:i + _SQL_CHUNK]
+            rows = self._conn.execute(
+                "SELECT c.chunk_id, c.doc_id, d.filename, c.page, c.start_offset, c.end_offset, c.text "
+                "FROM chunks c JOIN documents d ON d.doc_id = c.doc_id "
+                f"WHERE c.chunk_id IN ({','.join('?' * len(part))})",
+                part
+            )
+            for cid, doc_id, filename, page, start, end, text in rows:
+                meta[cid] = {"doc_id": doc_id, "filename": filename, "page": page,
+                             "start": start, "end": end, "text": text}
+        return meta
+
+    def search(self, query_vector, top_k: int = 5) -> List[Dict[str, Any]]:
+        """Top-k chunks across the corpus with their source attribution and cosine score."""
+        query = normalize(query_vector)
+        with self._lock:
+            self._refresh()
+            if self.index.ntotal == 0:
+                return []
+
+            fetch = top_k * CORPUS_RERANK_FACTOR if self.index_type == "ivfpq" else top_k
+            D, I = self.index.search(query, fetch)
+            ids = [int(i) for i in I[0] if i >= 0]
+            scores = {int(i): float(d) for i, d in zip(I[0], D[0]) if i >= 0}
+
+            if self.index_type == "ivfpq" and ids:
+                exact = np.asarray(self._vector_view()[ids], dtype="float32") @ query[0]
+                scores = dict(zip(ids, exact.tolist()))
+                ids = sorted(ids, key=lambda cid: -scores[cid])
+
+            ids = ids[:top_k]
+            meta = self._chunk_metadata(ids)
+
+        return [{**meta[cid], "chunk_id": cid, "score": round(scores[cid], 4)} for cid in ids if cid in meta]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            documents = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            return {
+                "corpus_id": self.corpus_id,
+                "index_type": self.index_type,
+                "documents": documents,
+                "chunks": int(self.index.ntotal),
+                "vector_rows": self._vector_rows(),
+            }
+
+
+_CORPORA: Dict[str, CorpusIndex] = {}
+_CORPORA_LOCK = threading.Lock()
+
+
+def get_corpus(corpus_id: str, dim: int, model_id: str) -> CorpusIndex:
+    """Open (or create) a corpus; instances are shared within the process."""
+    with _CORPORA_LOCK:
+        corpus = _CORPORA.get(corpus_id)
+        if corpus is None:
+            corpus = CorpusIndex(corpus_id, dim, model_id)
+            _CORPORA[corpus_id] = corpus
+        return corpus
+
+
+def corpus_exists(corpus_id: str) -> bool:
+    return bool(_CORPUS_ID_RE.match(corpus_id or "")) and os.path.exists(
+        os.path.join(CORPUS_DIR, corpus_id, "meta.sqlite3"))
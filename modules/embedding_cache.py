@@ -0,0 +1,254 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from modules.config import CACHE_DIR
+from modules.persistent_cache import register_cache
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(CACHE_DIR, "embeddings"))
+EMBEDDING_CACHE_MAX_ROWS = int(os.getenv("EMBEDDING_CACHE_MAX_ROWS", "200000"))
+# Unready claims older than this are treated as abandoned (writer crashed) and freed
+EMBEDDING_CLAIM_GRACE_SECONDS = int(os.getenv("EMBEDDING_CLAIM_GRACE_SECONDS", "600"))
+
+_SQL_CHUNK = 500
+
+
+class EmbeddingCache:
+    """
+    Chunk embeddings keyed by SHA-256 of (model id, chunk text).
+
+    Vectors live in a fixed-capacity memory-mapped float32 matrix
+    (<model>-d<dim>.f32, one row per slot); a SQLite table maps each key to
+    its slot. When full, the least recently used slots are reused.
+
+    A slot is claimed (ready=0) before its row is overwritten and published
+    (ready=1) afterwards, and readers re-check the mapping after copying the
+    row, so another worker process reusing a slot can never hand out a
+    vector under the wrong key. Only ready slots are evicted: a claimed slot
+    is left to its writer until EMBEDDING_CLAIM_GRACE_SECONDS have passed.
+    """
+
+    def __init__(self, model_id: str, dim: int, max_rows: int = EMBEDDING_CACHE_MAX_ROWS,
+                 root: str = EMBEDDING_CACHE_DIR):
+        self.model_id = model_id
+        self.dim = dim
+        self.max_rows = max_rows
+        name = f"{model_id}-d{dim}".replace("/", "_")
+        self.name = f"embeddings:{name}"
+        os.makedirs(root, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(root, f"{name}.sqlite3"), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS slots ("
+            " key TEXT PRIMARY KEY,"
+            " slot INTEGER NOT NULL UNIQUE,"
+            " accessed_at REAL NOT NULL,"
+            " ready INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_slots_accessed ON slots(accessed_at)")
+        # Capacity may have been lowered since the last run
+        self._conn.execute("DELETE FROM slots WHERE slot >= ?", (max_rows,))
+        self._conn.commit()
+
+        # Grow (never truncate) the matrix file so concurrent workers agree on its layout
+        path = os.path.join(root, f"{name}.f32")
+        size = max_rows * dim * 4
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+        finally:
+            os.close(fd)
+        self._matrix = np.memmap(path, dtype="float32", mode="r+", shape=(max_rows, dim))
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        register_cache(self.name, self)
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_id}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _ready_slots(self, keys: List[str]) -> Dict[str, int]:
+        slots: Dict[str, int] = {}
+        for i in range(0, len(keys), _SQL_CHUNK):
+            part = keys[i:i + _SQL_CHUNK]
+            rows = self._conn.execute(
+                f"SELECT key, slot FROM slots WHERE ready = 1 AND key IN ({','.join('?' * len(part))})",
+                part
+            ).fetchall()
+            slots.update(rows)
+        return slots
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+
+        with self._lock:
+            slots = self._ready_slots(keys)
+            vectors = {key: np.array(self._matrix[slot]) for key, slot in slots.items()}
+
+            # Drop anything whose slot was reclaimed while we were copying it
+            still = self._ready_slots(list(vectors))
+            vectors = {key: vec for key, vec in vectors.items() if still.get(key) == slots[key]}
+
+            if vectors:
+                now = time.time()
+                self._conn.executemany("UPDATE slots SET accessed_at = ? WHERE key = ?",
+                                       [(now, key) for key in vectors])
+                self._conn.commit()
+
+            self.hits += len(vectors)
+            self.misses += len(keys) - len(vectors)
+        return vectors
+
+    def _claim_slots(self, keys: List[str], now: float) -> Dict[str, int]:
+        """
+        Claim an unready slot for every key not stored yet, using free slots
+        first and then the least recently used ready ones. Keys left without
+        a slot (every other slot is claimed) are not cached.
+        """
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            abandoned = self._conn.execute("DELETE FROM slots WHERE ready = 0 AND accessed_at < ?",
+                                           (now - EMBEDDING_CLAIM_GRACE_SECONDS,)).rowcount
+            if abandoned:
+                logger.warning(f"Freed {abandoned} abandoned embedding cache claims in {self.name}")
+
+            placeholders = ",".join("?" * len(keys))
+            existing = {row[0] for row in self._conn.execute(
+                f"SELECT key FROM slots WHERE key IN ({placeholders})", keys)}
+            new_keys = [k for k in keys if k not in existing]
+            if not new_keys:
+                self._conn.commit()
+                return {}
+
+            used = self._conn.execute("SELECT COUNT(*) FROM slots").fetchone()[0]
+            wanted = min(len(new_keys), self.max_rows - used)
+            fresh: List[int] = []
+            if wanted > 0:
+                top = self._conn.execute("SELECT COALESCE(MAX(slot), -1) + 1 FROM slots").fetchone()[0]
+                fresh = list(range(top, min(self.max_rows, top + wanted)))
+                if len(fresh) < wanted:
+                    # Gaps below the top, left by a lowered capacity or abandoned claims
+                    taken = {row[0] for row in self._conn.execute("SELECT slot FROM slots")}
+                    fresh += [s for s in range(top) if s not in taken][:wanted - len(fresh)]
+
+            reuse = len(new_keys) - len(fresh)
+            if reuse > 0:
+                victims = self._conn.execute(
+                    f"SELECT key, slot FROM slots WHERE ready = 1 AND key NOT IN ({placeholders}) "
+                    "ORDER BY accessed_at ASC LIMIT ?",
+                    (*keys, reuse)
+                ).fetchall()
+                self._conn.executemany("DELETE FROM slots WHERE key = ?", [(k,) for k, _ in victims])
+                self.evictions += len(victims)
+                fresh += [slot for _, slot in victims]
+
+            claimed = dict(zip(new_keys, fresh))
+            self._conn.executemany(
+                "INSERT INTO slots (key, slot, accessed_at, ready) VALUES (?, ?, ?, 0)",
+                [(key, slot, now) for key, slot in claimed.items()]
+            )
+            self._conn.commit()
+            return claimed
+        except Exception:
+            self._conn.rollback()
+            raise
+
+    def put_many(self, items: Dict[str, np.ndarray]) -> None:
+        # Never store more than the cache can hold in one go
+        keys = list(items)[:self.max_rows]
+        if not keys:
+            return
+
+        with self._lock:
+            now = time.time()
+            for i in range(0, len(keys), _SQL_CHUNK):
+                part = keys[i:i + _SQL_CHUNK]
+                slots = self._claim_slots(part, now)
+
+                if not slots:
+                    continue
+
+                for key, slot in slots.items():
+                    self._matrix[slot] = np.asarray(items[key], dtype="float32")
+                self._matrix.flush()
+
+                self._conn.executemany("UPDATE slots SET ready = 1 WHERE key = ? AND slot = ?",
+                                       [(key, slot) for key, slot in slots.items()])
+                self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM slots WHERE ready = 1").fetchone()[0]
+
+    def stats(self) -> Dict[str, object]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "max_entries": self.max_rows,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+_EMBEDDING_CACHES: Dict[str, EmbeddingCache] = {}
+_EMBEDDING_CACHES_LOCK = threading.Lock()
+
+
+def get_embedding_cache(model_id: str, dim: int) -> Optional[EmbeddingCache]:
+    """Shared cache for a model, or None when EMBEDDING_CACHE_MAX_ROWS <= 0."""
+    if EMBEDDING_CACHE_MAX_ROWS <= 0:
+        return None
+    key = f"{model_id}-d{dim}"
+    with _EMBEDDING_CACHES_LOCK:
+        cache = _EMBEDDING_CACHES.get(key)
+        if cache is None:
+            cache = EmbeddingCache(model_id, dim)
+            _EMBEDDING_CACHES[key] = cache
+        return cache
+
+
+def encode_cached(texts: List[str], encode: Callable[[List[str]], np.ndarray],
+                  cache: Optional[EmbeddingCache]) -> np.ndarray:
+    """
+    Embed `texts`, calling `encode` only for texts not already cached.
+    Returns a float32 matrix in the order of `texts`.
+    """
+    if cache is None:
+        return np.asarray(encode(texts), dtype="float32")
+    if not texts:
+        return np.zeros((0, cache.dim), dtype="float32")
+
+    keys = [cache.key(t) for t in texts]
+    found = cache.get_many(keys)
+
+    missing: Dict[str, str] = {}
+    for key, text in zip(keys, texts):
+        if key not in found and key not in missing:
+            missing[key] = text
+
+    if missing:
+        fresh = np.asarray(encode(list(missing.values())), dtype="float32")
+        computed = dict(zip(missing, fresh))
+        cache.put_many(computed)
+        found.update(computed)
+
+    logger.info(f"Embedded {len(missing)} new chunks, {len(texts) - len(missing)} from cache")
+    return np.stack([found[key] for key in keys])
@@ -56,8 +56,50 @@ def _pick_color(importance: str):
     return None
 
 
+def _highlight_matching_blocks(page, blocks, prepared_items):
+    """
+    Highlight every block whose text matches an important paragraph.
+    `blocks` are (rects, text) pairs; a block's rects are highlighted together.
+    """
+    for rects, block_text in blocks:
+        if not block_text or not str(block_text).strip():
+            continue
+
+        norm_block = normalize(block_text)
+        if not norm_block:
+            continue
+
+        # Try to match this block against all important paragraphs
+        for prepared in prepared_items:
+            norm_para = prepared["norm_paragraph"]
+            color = prepared["color"]
+
+            # 1) Token overlap (robust to line breaks / partial matches)
+            overlap_ratio, shared_tokens = token_overlap_stats(norm_para, norm_block)
+
+            # 2) Fuzzy ratio (works well when block ~ whole paragraph)
+            fuzzy_sim = fuzzy_ratio(norm_para, norm_block)
+
+            # Heuristic thresholds tuned for legal PDFs:
+            # - require at least 5 shared tokens to avoid spurious matches
+            # - accept if either token overlap OR fuzzy similarity is high enough
+            if shared_tokens >= 5 and (overlap_ratio >= 0.5 or fuzzy_sim >= 0.6):
+                annot = page.add_highlight_annot(rects)
+                annot.set_colors(stroke=color, fill=color)
+                annot.update()
+
+
+def _ocr_blocks(page, layout):
+    """OCR paragraphs of a scanned page as (line rects in page coordinates, text) blocks."""
+    derotation = page.derotation_matrix
+    return [
+        ([fitz.Rect(box) * derotation for box in line_boxes], text)
+        for text, line_boxes in layout.paragraphs()
+    ]
+
+
 def highlight_paragraphs_in_original_pdf(
-    input_pdf_path, paragraph_data, output_path: str = "highlighted_output.pdf"
+    input_pdf_path, paragraph_data, output_path: str = "highlighted_output.pdf", ocr_layouts=None
 ):
     """
     Highlight important paragraphs in the original PDF using bounding boxes.
@@ -65,6 +107,9 @@ def highlight_paragraphs_in_original_pdf(
     Matching is robust across different PDF layouts by combining:
     - token overlap (word-level) similarity
     - fuzzy (SequenceMatcher) similarity for shorter blocks
+
+    Scanned pages are highlighted line by line from the OCR word boxes in
+    `ocr_layouts` (1-based page number -> PageLayout), without OCR-ing again.
     """
 
     doc = fitz.open(input_pdf_path)
@@ -94,41 +139,23 @@ def highlight_paragraphs_in_original_pdf(
         )
 
     for page in doc:
+        # Scanned pages were OCR'd because their text layer is missing or too thin to use
+        layout = (ocr_layouts or {}).get(page.number + 1)
+        if layout is not None:
+            _highlight_matching_blocks(page, _ocr_blocks(page, layout), prepared_items)
+            continue
+
         blocks = page.get_text("blocks") or []  # (x1, y1, x2, y2, text, block_no)
 
-        # If there are no text blocks at all, this page is likely image-only (scanned PDF)
-        # Without text bounding boxes, we cannot reliably highlight on this page.
+        # If there are no text blocks and no OCR layout, this page cannot be highlighted
         if not blocks:
             continue
 
-        for block in blocks:
-            bx1, by1, bx2, by2, block_text, *_ = block
-            if not block_text or not str(block_text).strip():
-                continue
-
-            norm_block = normalize(block_text)
-            if not norm_block:
-                continue
-
-            # Try to match this block against all important paragraphs
-            for prepared in prepared_items:
-                norm_para = prepared["norm_paragraph"]
-                color = prepared["color"]
-
-                # 1) Token overlap (robust to line breaks / partial matches)
-                overlap_ratio, shared_tokens = token_overlap_stats(norm_para, norm_block)
-
-                # 2) Fuzzy ratio (works well when block ~ whole paragraph)
-                fuzzy_sim = fuzzy_ratio(norm_para, norm_block)
-
-                # Heuristic thresholds tuned for legal PDFs:
-                # - require at least 5 shared tokens to avoid spurious matches
-                # - accept if either token overlap OR fuzzy similarity is high enough
-                if shared_tokens >= 5 and (overlap_ratio >= 0.5 or fuzzy_sim >= 0.6):
-                    rect = fitz.Rect(bx1, by1, bx2, by2)
-                    annot = page.add_highlight_annot(rect)
-                    annot.set_colors(stroke=color, fill=color)
-                    annot.update()
+        _highlight_matching_blocks(
+            page,
+            [([fitz.Rect(bx1, by1, bx2, by2)], block_text) for bx1, by1, bx2, by2, block_text, *_ in blocks],
+            prepared_items
+        )
 
     doc.save(output_path)
     doc.close()
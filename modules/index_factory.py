@@ -0,0 +1,204 @@
+import os
+import math
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+import faiss
+import numpy as np
+
+from modules.config import CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+# "auto" picks by vector count; "flat", "hnsw" and "ivfpq" force a type
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "auto")
+
+# Auto selection thresholds (number of chunks)
+FLAT_MAX_VECTORS = int(os.getenv("FAISS_FLAT_MAX_VECTORS", "20000"))
+HNSW_MAX_VECTORS = int(os.getenv("FAISS_HNSW_MAX_VECTORS", "200000"))
+
+HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("FAISS_HNSW_EF_CONSTRUCTION", "80"))
+HNSW_EF_SEARCH = int(os.getenv("FAISS_HNSW_EF_SEARCH", "64"))
+
+IVF_NPROBE = int(os.getenv("FAISS_IVF_NPROBE", "16"))
+# PQ codes alone lose too much recall; re-rank k_factor * k candidates on SQ8 codes
+IVF_REFINE = os.getenv("FAISS_IVF_REFINE", "SQ8")  # "" disables re-ranking
+IVF_REFINE_K_FACTOR = int(os.getenv("FAISS_IVF_REFINE_K_FACTOR", "8"))
+PQ_NBITS = 8
+PQ_DIMS_PER_SUBQUANTIZER = 8
+IVF_TRAINING_POINTS_PER_LIST = 39  # FAISS warns below this many points per centroid
+
+# Trained (empty) IVF-PQ indexes are kept here and reused across documents
+QUANTIZER_DIR = os.getenv("FAISS_QUANTIZER_DIR", os.path.join(CACHE_DIR, "faiss_quantizers"))
+
+_QUANTIZER_LOCK = threading.Lock()
+
+
+def normalize(vectors) -> np.ndarray:
+    """float32, C-contiguous, L2-normalized copy so inner product == cosine similarity."""
+    vectors = np.ascontiguousarray(np.asarray(vectors, dtype="float32"))
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    vectors = vectors.copy()
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def _ivf_nlist(n_vectors: int) -> int:
+    # ~4*sqrt(n) lists, capped so every list gets enough training points
+    nlist = int(4 * math.sqrt(n_vectors))
+    nlist = min(nlist, n_vectors // IVF_TRAINING_POINTS_PER_LIST)
+    return max(1, nlist)
+
+
+def _pq_subquantizers(dim: int) -> int:
+    m = max(1, dim // PQ_DIMS_PER_SUBQUANTIZER)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def resolve_index_config(n_vectors: int, dim: int,
+                         config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Fill in an index config for `n_vectors` vectors of dimension `dim`.
+
+    `config` may set "type" ("auto", "flat", "hnsw", "ivfpq") and any of the
+    type's parameters (hnsw: m, ef_construction, ef_search; ivfpq: nlist,
+    pq_m, nbits, nprobe, refine, k_factor). Missing values come from the
+    environment defaults.
+    """
+    config = dict(config or {})
+    index_type = config.get("type") or FAISS_INDEX_TYPE
+
+    if index_type == "auto":
+        if n_vectors <= FLAT_MAX_VECTORS:
+            index_type = "flat"
+        elif n_vectors <= HNSW_MAX_VECTORS:
+            index_type = "hnsw"
+        else:
+            index_type = "ivfpq"
+
+    # PQ training needs 2**nbits points per sub-quantizer; fall back to HNSW for small sets
+    nbits = config.get("nbits", PQ_NBITS)
+    if index_type == "ivfpq" and n_vectors < max(2 ** nbits, IVF_TRAINING_POINTS_PER_LIST):
+        logger.warning(f"Too few vectors ({n_vectors}) to train IVF-PQ, using HNSW instead")
+        index_type = "hnsw"
+
+    resolved: Dict[str, Any] = {"type": index_type}
+    if index_type == "hnsw":
+        resolved["m"] = config.get("m", HNSW_M)
+        resolved["ef_construction"] = config.get("ef_construction", HNSW_EF_CONSTRUCTION)
+        resolved["ef_search"] = config.get("ef_search", HNSW_EF_SEARCH)
+    elif index_type == "ivfpq":
+        resolved["nlist"] = config.get("nlist", _ivf_nlist(n_vectors))
+        resolved["pq_m"] = config.get("pq_m", _pq_subquantizers(dim))
+        resolved["nbits"] = nbits
+        resolved["nprobe"] = config.get("nprobe", IVF_NPROBE)
+        resolved["refine"] = config.get("refine", IVF_REFINE)
+        resolved["k_factor"] = config.get("k_factor", IVF_REFINE_K_FACTOR)
+    elif index_type != "flat":
+        raise ValueError(f"Unknown FAISS index type '{index_type}'")
+
+    return resolved
+
+
+def _ivfpq_factory(config: Dict[str, Any]) -> str:
+    factory = f"IVF{config['nlist']},PQ{config['pq_m']}x{config['nbits']}"
+    if config["refine"]:
+        factory += f",Refine({config['refine']})"
+    return factory
+
+
+def _quantizer_path(dim: int, config: Dict[str, Any], model_id: str) -> str:
+    name = f"{model_id}-d{dim}-{_ivfpq_factory(config)}.faiss"
+    for ch in "/,()":
+        name = name.replace(ch, "_")
+    return os.path.join(QUANTIZER_DIR, name)
+
+
+def load_or_train_ivfpq(vectors: np.ndarray, config: Dict[str, Any], model_id: str):
+    """
+    Empty IVF-PQ index with trained coarse and product quantizers.
+    Reused from QUANTIZER_DIR when one was trained for the same model and
+    parameters; otherwise trained on `vectors` and saved for next time.
+    """
+    dim = vectors.shape[1]
+    path = _quantizer_path(dim, config, model_id)
+
+    with _QUANTIZER_LOCK:
+        if os.path.exists(path) and not config.get("retrain"):
+            try:
+                index = faiss.read_index(path)
+                if index.is_trained and index.ntotal == 0:
+                    return index
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable trained quantizer {path}: {e}")
+
+        factory = _ivfpq_factory(config)
+        index = faiss.index_factory(dim, factory, faiss.METRIC_INNER_PRODUCT)
+        logger.info(f"Training {factory} on {len(vectors)} vectors")
+        index.train(vectors)
+
+        try:
+            os.makedirs(QUANTIZER_DIR, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            faiss.write_index(index, tmp_path)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Could not persist trained quantizer {path}: {e}")
+
+        return index
+
+
+def configure_search(index, config: Dict[str, Any]) -> None:
+    """Apply query-time parameters (efSearch / nprobe) to an index."""
+    index_type = config.get("type")
+    if index_type == "hnsw":
+        faiss.downcast_index(index).hnsw.efSearch = config["ef_search"]
+    elif index_type == "ivfpq":
+        faiss.extract_index_ivf(index).nprobe = config["nprobe"]
+        if config.get("refine"):
+            faiss.downcast_index(index).k_factor = config["k_factor"]
+
+
+def build_index(embeddings, config: Optional[Dict[str, Any]] = None,
+                model_id: str = "embeddings"):
+    """
+    Build a cosine-similarity (normalized inner product) FAISS index.
+    Returns (index, resolved_config).
+    """
+    vectors = normalize(embeddings)
+    n_vectors, dim = vectors.shape
+    config = resolve_index_config(n_vectors, dim, config)
+
+    if config["type"] == "flat":
+        index = faiss.IndexFlatIP(dim)
+    elif config["type"] == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, config["m"], faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = config["ef_construction"]
+    else:
+        index = load_or_train_ivfpq(vectors, config, model_id)
+
+    index.add(vectors)
+    configure_search(index, config)
+    logger.info(f"Built {config['type']} index over {n_vectors} vectors")
+    return index, config
+
+
+def search_index(index, query_vectors, top_k: int):
+    """
+    Search with normalized queries. Returns (scores, ids) as lists per query,
+    with the -1 padding FAISS uses for missing neighbours removed.
+    """
+    queries = normalize(query_vectors)
+    D, I = index.search(queries, top_k)
+
+    scores, ids = [], []
+    for row_d, row_i in zip(D, I):
+        keep = row_i >= 0
+        scores.append(row_d[keep].tolist())
+        ids.append(row_i[keep].tolist())
+    return scores, ids
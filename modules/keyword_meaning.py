@@ -1,7 +1,13 @@
 import os
+import csv
 import json  # <-- Import json
+import logging
+from typing import Dict, Optional
 from groq import Groq
 
+from modules.persistent_cache import PersistentCache
+from modules.rate_limiter import get_groq_limiter, estimate_tokens
+
 # Initialize the client (make sure GROQ_API_KEY is set in your environment)
 try:
     client = Groq(api_key=os.getenv("GROQ_API_KEY"))
@@ -9,17 +15,77 @@ except Exception as e:
     print(f"Warning: Could not initialize Groq client. {e}")
     client = None
 
-def get_keywords_meaning_smart(keywords: list[str]) -> dict:
+# Glossary configuration
+GLOSSARY_MAX_ENTRIES = int(os.getenv("GLOSSARY_MAX_ENTRIES", "100000"))
+GLOSSARY_EVICTION = os.getenv("GLOSSARY_EVICTION", "lru")  # "lru" or "fifo"
+GLOSSARY_TTL_DAYS = os.getenv("GLOSSARY_TTL_DAYS")  # unset = definitions never expire
+GLOSSARY_SEED_PATH = os.getenv("GLOSSARY_SEED_PATH")  # optional JSON/CSV dictionary
+
+_GLOSSARY: Optional[PersistentCache] = None
+
+
+def get_glossary() -> PersistentCache:
+    """Persistent term -> definition store shared across uploads and workers."""
+    global _GLOSSARY
+    if _GLOSSARY is None:
+        _GLOSSARY = PersistentCache(
+            "glossary",
+            max_entries=GLOSSARY_MAX_ENTRIES,
+            ttl_seconds=float(GLOSSARY_TTL_DAYS) * 86400 if GLOSSARY_TTL_DAYS else None,
+            eviction=GLOSSARY_EVICTION
+        )
+    return _GLOSSARY
+
+
+def _glossary_key(term: str) -> str:
+    return " ".join(str(term).lower().split())
+
+
+def seed_glossary(path: str) -> int:
     """
-    Use Groq API (Llama) to decide which keywords need explanation and explain them briefly.
-    Returns a dictionary: {keyword: meaning or "No explanation needed"}
+    Pre-seed the glossary from a dictionary file.
+    JSON: {"term": "definition", ...} or [{"term": ..., "definition": ...}, ...]
+    CSV: "term,definition" rows (a header row with those names is optional).
+    Returns the number of terms loaded.
     """
-    if not client:
-        return {"error": "Groq client is not initialized. Check GROQ_API_KEY."}
-        
-    if not keywords:
-        return {} # Return an empty dict if no keywords are provided
+    entries: Dict[str, str] = {}
+
+    if path.lower().endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            items = data.items()
+        else:
+            items = ((row.get("term"), row.get("definition")) for row in data if isinstance(row, dict))
+    else:
+        with open(path, encoding="utf-8", newline="") as f:
+            rows = list(csv.reader(f))
+        if rows and [c.strip().lower() for c in rows[0][:2]] == ["term", "definition"]:
+            rows = rows[1:]
+        items = (row[:2] for row in rows if len(row) >= 2)
+
+    for term, definition in items:
+        if term and isinstance(definition, str) and definition.strip():
+            entries[_glossary_key(term)] = definition.strip()
+
+    get_glossary().set_many(entries)
+    logging.info(f"Seeded glossary with {len(entries)} terms from {path}")
+    return len(entries)
+
+
+def seed_glossary_from_env() -> int:
+    """Seed the glossary from GLOSSARY_SEED_PATH, if configured."""
+    if not GLOSSARY_SEED_PATH:
+        return 0
+    try:
+        return seed_glossary(GLOSSARY_SEED_PATH)
+    except Exception as e:
+        logging.error(f"Failed to seed glossary from {GLOSSARY_SEED_PATH}: {e}")
+        return 0
+
 
+def _define_terms_with_llm(keywords: list[str]) -> dict:
+    """Ask Groq to define the given terms. Returns the parsed JSON object (raises on failure)."""
     # Combine all keywords into one string for the prompt
     keyword_list_str = ", ".join(keywords)
 
@@ -37,33 +103,79 @@ def get_keywords_meaning_smart(keywords: list[str]) -> dict:
     Example:
     {{"liability": "A legal responsibility for one's actions or debts.", "contract": "A legally binding agreement.", "with": "No explanation needed"}}
     """
-    
+
     # User prompt provides only the data
     user_prompt = f"Here is the list of keywords: {keyword_list_str}"
 
-    try:
-        response = client.chat.completions.create(
-            model="llama-3.1-8b-instant",  # Recommended model for JSON tasks
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-            temperature=0.1,
-            max_tokens=1024, # Give it enough space for definitions
-            response_format={"type": "json_object"}  # <-- 1. GUARANTEES JSON OUTPUT
-        )
+    get_groq_limiter().acquire(estimate_tokens(system_prompt + user_prompt, 1024))
 
-        # Extract the response content (which is now a guaranteed JSON string)
-        result_text = response.choices[0].message.content
-        
-        # --- 2. RELIABLE JSON PARSING ---
-        try:
-            # Safely parse the guaranteed JSON string into a Python dictionary
-            return json.loads(result_text)
-        except json.JSONDecodeError as e:
-            # This should rarely happen, but it's good practice to have it
-            return {"error": f"Failed to decode the JSON response from API: {e}"}
-        # --- End of fix ---
+    response = client.chat.completions.create(
+        model="llama-3.1-8b-instant",  # Recommended model for JSON tasks
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ],
+        temperature=0.1,
+        max_tokens=1024, # Give it enough space for definitions
+        response_format={"type": "json_object"}  # <-- 1. GUARANTEES JSON OUTPUT
+    )
 
-    except Exception as e:
-        return {"error": f"⚠️ Error fetching meanings: {e}"}
\ No newline at end of file
+    # Extract the response content (which is now a guaranteed JSON string)
+    result_text = response.choices[0].message.content
+
+    # --- 2. RELIABLE JSON PARSING ---
+    return json.loads(result_text)
+
+
+def get_keywords_meaning_smart(keywords: list[str]) -> dict:
+    """
+    Use Groq API (Llama) to decide which keywords need explanation and explain them briefly.
+    Terms already in the glossary are answered locally; only unknown terms are sent
+    to the LLM and their definitions are added to the glossary.
+    Returns a dictionary: {keyword: meaning or "No explanation needed"}
+    """
+    if not keywords:
+        return {} # Return an empty dict if no keywords are provided
+
+    glossary = get_glossary()
+    known = glossary.get_many(_glossary_key(kw) for kw in keywords)
+    unknown = [kw for kw in dict.fromkeys(keywords) if _glossary_key(kw) not in known]
+
+    logging.info(f"Glossary: {len(keywords) - len(unknown)} known terms, {len(unknown)} to define")
+
+    if unknown:
+        if not client:
+            if not known:
+                return {"error": "Groq client is not initialized. Check GROQ_API_KEY."}
+            logging.error("Groq client is not initialized, returning glossary terms only")
+        else:
+            try:
+                defined = _define_terms_with_llm(unknown)
+
+                # The model may change case/spacing of the keys; match on the glossary key
+                fresh = {
+                    _glossary_key(term): meaning
+                    for term, meaning in defined.items()
+                    if isinstance(meaning, str) and meaning.strip()
+                }
+                fresh = {key: fresh[key] for key in map(_glossary_key, unknown) if key in fresh}
+
+                glossary.set_many(fresh)
+                known.update(fresh)
+
+            except json.JSONDecodeError as e:
+                # This should rarely happen, but it's good practice to have it
+                if not known:
+                    return {"error": f"Failed to decode the JSON response from API: {e}"}
+                logging.error(f"Failed to decode the JSON response from API: {e}")
+
+            except Exception as e:
+                if not known:
+                    return {"error": f"⚠️ Error fetching meanings: {e}"}
+                logging.error(f"Error fetching meanings: {e}")
+
+    return {
+        kw: known[_glossary_key(kw)]
+        for kw in keywords
+        if _glossary_key(kw) in known
+    }
@@ -0,0 +1,152 @@
+import os
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Registry names for the models shared across the app
+SENTENCE_MODEL = "minilm"
+KEYWORD_MODEL = "legalbert"
+
+SENTENCE_MODEL_ID = "all-MiniLM-L6-v2"
+
+_LOADERS: Dict[str, Callable[[], Any]] = {}
+_MODELS: Dict[str, Any] = {}
+_STATS: Dict[str, Dict[str, Any]] = {}
+
+_REGISTRY_LOCK = threading.Lock()
+_LOAD_LOCKS: Dict[str, threading.Lock] = {}
+
+
+def _current_rss_bytes() -> Optional[int]:
+    """Resident set size of this process (Linux only, None elsewhere)."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return None
+
+
+def _estimate_model_bytes(model: Any, depth: int = 0) -> Optional[int]:
+    """
+    Estimate parameter + buffer memory of a torch-backed model.
+    Wrappers like KeyBERT are unwrapped through their `model` / `embedding_model` attributes.
+    """
+    if model is None or depth > 3:
+        return None
+
+    if callable(getattr(model, "parameters", None)) and callable(getattr(model, "buffers", None)):
+        try:
+            total = sum(p.numel() * p.element_size() for p in model.parameters())
+            total += sum(b.numel() * b.element_size() for b in model.buffers())
+            return total
+        except Exception:
+            return None
+
+    for attr in ("model", "embedding_model"):
+        size = _estimate_model_bytes(getattr(model, attr, None), depth + 1)
+        if size is not None:
+            return size
+
+    return None
+
+
+def register_model(name: str, loader: Callable[[], Any]) -> None:
+    """Register a zero-argument loader. The model is built on first `get_model` call."""
+    with _REGISTRY_LOCK:
+        _LOADERS[name] = loader
+        _LOAD_LOCKS.setdefault(name, threading.Lock())
+
+
+def get_model(name: str) -> Any:
+    """
+    Return the shared instance of a registered model, loading it exactly once.
+    Concurrent callers block on a per-model lock, so other models can load in parallel.
+    """
+    model = _MODELS.get(name)
+    if model is not None:
+        return model
+
+    with _REGISTRY_LOCK:
+        if name not in _LOADERS:
+            raise KeyError(f"Model '{name}' is not registered")
+        load_lock = _LOAD_LOCKS[name]
+        loader = _LOADERS[name]
+
+    with load_lock:
+        model = _MODELS.get(name)
+        if model is not None:
+            return model
+
+        logging.info(f"Loading model '{name}'...")
+        rss_before = _current_rss_bytes()
+        start = time.perf_counter()
+
+        try:
+            model = loader()
+        except Exception as e:
+            _STATS[name] = {"loaded": False, "error": str(e)}
+            logging.error(f"Failed to load model '{name}': {e}")
+            raise
+
+        load_seconds = time.perf_counter() - start
+        rss_after = _current_rss_bytes()
+
+        _MODELS[name] = model
+        _STATS[name] = {
+            "loaded": True,
+            "load_seconds": round(load_seconds, 3),
+            "param_bytes": _estimate_model_bytes(model),
+            "rss_delta_bytes": (
+                rss_after - rss_before
+                if rss_before is not None and rss_after is not None else None
+            ),
+            "loaded_at": time.time(),
+        }
+        logging.info(f"Model '{name}' loaded in {load_seconds:.2f}s")
+        return model
+
+
+def is_loaded(name: str) -> bool:
+    return name in _MODELS
+
+
+def model_stats() -> Dict[str, Dict[str, Any]]:
+    """Load timings and memory footprint for every registered model."""
+    with _REGISTRY_LOCK:
+        names = list(_LOADERS)
+
+    return {
+        name: dict(_STATS.get(name, {"loaded": False}))
+        for name in names
+    }
+
+
+# -------------------------------
+# DEFAULT MODELS
+# -------------------------------
+def _load_sentence_model():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(SENTENCE_MODEL_ID)
+
+
+def _load_keyword_model():
+    from modules.keyword import load_legalbert_model
+    return load_legalbert_model()
+
+
+register_model(SENTENCE_MODEL, _load_sentence_model)
+register_model(KEYWORD_MODEL, _load_keyword_model)
+
+
+def get_sentence_model():
+    """Shared MiniLM model used by importance scoring and the FAISS store."""
+    return get_model(SENTENCE_MODEL)
+
+
+def get_keyword_model():
+    """Shared LegalBERT-backed KeyBERT model."""
+    return get_model(KEYWORD_MODEL)
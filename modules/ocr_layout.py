@@ -0,0 +1,161 @@
+import base64
+import math
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+Box = Tuple[float, float, float, float]
+
+
+def _encode(array: np.ndarray) -> str:
+    return base64.b64encode(np.ascontiguousarray(array).tobytes()).decode("ascii")
+
+
+def _decode(data: str, dtype: str, shape) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype=dtype).reshape(shape).copy()
+
+
+def _unrotate(boxes: np.ndarray, angle: float, size: Tuple[int, int]) -> np.ndarray:
+    """
+    Map boxes found on an image rotated by PIL's rotate(angle) (degrees,
+    counter-clockwise about the centre, same size) back onto the original
+    image, as the axis-aligned boxes around their rotated corners.
+    """
+    cx, cy = size[0] / 2.0, size[1] / 2.0
+    theta = math.radians(angle)
+    cos_t, sin_t = math.cos(theta), math.sin(theta)
+
+    corners = np.stack([
+        boxes[:, [0, 1]], boxes[:, [2, 1]], boxes[:, [0, 3]], boxes[:, [2, 3]]
+    ], axis=1) - (cx, cy)                                      # (n, 4 corners, xy)
+    x = corners[..., 0] * cos_t - corners[..., 1] * sin_t + cx
+    y = corners[..., 0] * sin_t + corners[..., 1] * cos_t + cy
+    return np.stack([x.min(axis=1), y.min(axis=1), x.max(axis=1), y.max(axis=1)], axis=1)
+
+
+class PageLayout:
+    """
+    Words OCR'd from one page, array-backed:
+
+        words       recognized words, in reading order
+        boxes       (n, 4) float32 x0, y0, x1, y1 in PDF points, origin at the
+                    top-left of the page as displayed (cropbox, after /Rotate)
+        line_ids    (n,) int32 line number of each word, increasing down the page
+        par_ids     (n,) int32 paragraph number of each word
+        conf        (n,) uint8 tesseract word confidence, 0-100
+
+    Convert display coordinates to PyMuPDF page coordinates with
+    `fitz.Rect(box) * page.derotation_matrix`.
+    """
+
+    def __init__(self, words: List[str], boxes: np.ndarray, line_ids: np.ndarray,
+                 par_ids: np.ndarray, conf: np.ndarray):
+        self.words = words
+        self.boxes = boxes
+        self.line_ids = line_ids
+        self.par_ids = par_ids
+        self.conf = conf
+
+    @classmethod
+    def from_tesseract(cls, data: Dict[str, List], points_per_px: float, skew: float = 0.0,
+                       image_size: Optional[Tuple[int, int]] = None) -> "PageLayout":
+        """
+        Build from pytesseract.image_to_data(..., output_type=DICT) output.
+        `points_per_px` is 72 / effective DPI of the OCR'd image; if that image
+        was deskewed by `skew` degrees, boxes are rotated back onto the
+        rendered page (`image_size` is the OCR'd image size).
+        """
+        words, boxes, line_ids, par_ids, conf = [], [], [], [], []
+        line_keys: Dict[Tuple[int, int, int], int] = {}
+        par_keys: Dict[Tuple[int, int], int] = {}
+
+        for i, word in enumerate(data["text"]):
+            word = word.strip()
+            word_conf = float(data["conf"][i])
+            if not word or word_conf < 0:
+                continue
+
+            par = (data["block_num"][i], data["par_num"][i])
+            line = (*par, data["line_num"][i])
+            words.append(word)
+            boxes.append((data["left"][i], data["top"][i],
+                          data["left"][i] + data["width"][i], data["top"][i] + data["height"][i]))
+            line_ids.append(line_keys.setdefault(line, len(line_keys)))
+            par_ids.append(par_keys.setdefault(par, len(par_keys)))
+            conf.append(min(max(int(round(word_conf)), 0), 100))
+
+        box_array = np.asarray(boxes, dtype="float64").reshape(-1, 4)
+        if len(box_array) and image_size and abs(skew) > 0:
+            box_array = _unrotate(box_array, skew, image_size)
+
+        return cls(
+            words,
+            (box_array * points_per_px).astype("float32"),
+            np.asarray(line_ids, dtype="int32"),
+            np.asarray(par_ids, dtype="int32"),
+            np.asarray(conf, dtype="uint8"),
+        )
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def text(self) -> str:
+        """Words joined into lines, with a blank line between paragraphs."""
+        lines: List[str] = []
+        for i, word in enumerate(self.words):
+            if i and self.line_ids[i] == self.line_ids[i - 1]:
+                lines[-1] += " " + word
+                continue
+            if i and self.par_ids[i] != self.par_ids[i - 1]:
+                lines.append("")
+            lines.append(word)
+        return "\n".join(lines)
+
+    def confidence(self) -> Optional[float]:
+        """Character-weighted mean word confidence in [0, 1]; None without words."""
+        if not self.words:
+            return None
+        lengths = np.fromiter((len(w) for w in self.words), dtype="float64", count=len(self.words))
+        return round(float((self.conf * lengths).sum() / lengths.sum()) / 100.0, 4)
+
+    def paragraphs(self) -> Iterator[Tuple[str, List[Box]]]:
+        """(paragraph text, one box per line) for every OCR paragraph."""
+        if not self.words:
+            return
+        starts = np.flatnonzero(np.diff(self.par_ids, prepend=-1))
+        ends = np.append(starts[1:], len(self.words))
+        for start, end in zip(starts, ends):
+            line_boxes = []
+            line_ids = self.line_ids[start:end]
+            for line in np.unique(line_ids):
+                boxes = self.boxes[start:end][line_ids == line]
+                line_boxes.append((float(boxes[:, 0].min()), float(boxes[:, 1].min()),
+                                   float(boxes[:, 2].max()), float(boxes[:, 3].max())))
+            yield " ".join(self.words[start:end]), line_boxes
+
+    def nbytes(self) -> int:
+        arrays = (self.boxes, self.line_ids, self.par_ids, self.conf)
+        return sum(a.nbytes for a in arrays) + sum(len(w) for w in self.words)
+
+    # ---- serialization (JSON-safe, for the OCR page cache) ----
+    def to_dict(self) -> Dict[str, Any]:
+        # Words never contain whitespace, so newline-joining them is lossless
+        return {
+            "words": "\n".join(self.words),
+            "boxes": _encode(self.boxes),
+            "line_ids": _encode(self.line_ids),
+            "par_ids": _encode(self.par_ids),
+            "conf": _encode(self.conf),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PageLayout":
+        words = data["words"].split("\n") if data["words"] else []
+        n = len(words)
+        return cls(
+            words,
+            _decode(data["boxes"], "float32", (n, 4)),
+            _decode(data["line_ids"], "int32", (n,)),
+            _decode(data["par_ids"], "int32", (n,)),
+            _decode(data["conf"], "uint8", (n,)),
+        )
@@ -0,0 +1,107 @@
+import os
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+# Resolution of the cheap probe render used to measure a page before OCR
+OCR_PROBE_DPI = int(os.getenv("OCR_PROBE_DPI", "72"))
+# Text line height (ascender to descender, in pixels) the render DPI is chosen for
+OCR_TARGET_LINE_PX = float(os.getenv("OCR_TARGET_LINE_PX", "30"))
+OCR_MIN_DPI = int(os.getenv("OCR_MIN_DPI", "150"))
+OCR_MAX_DPI = int(os.getenv("OCR_MAX_DPI", "300"))
+# Longest page side tesseract is given, as the fixed pipeline's resize did
+OCR_MAX_SIDE_PX = int(os.getenv("OCR_MAX_SIDE_PX", "2000"))
+
+SKEW_MAX_DEGREES = 5.0
+SKEW_STEP_DEGREES = 0.5
+DESKEW_MIN_DEGREES = 0.3
+
+_MIN_LINES = 3
+
+
+def otsu_threshold(gray: np.ndarray) -> int:
+    """Grey level that best separates ink (<= threshold) from paper (Otsu's method)."""
+    hist = np.bincount(gray.ravel(), minlength=256).astype("float64")
+    total = hist.sum()
+    if total == 0:
+        return 128
+
+    levels = np.arange(256)
+    weight_bg = np.cumsum(hist)
+    weight_fg = total - weight_bg
+    cum_mean = np.cumsum(hist * levels)
+    mean_bg = cum_mean / np.maximum(weight_bg, 1)
+    mean_fg = (cum_mean[-1] - cum_mean) / np.maximum(weight_fg, 1)
+    between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+    return int(np.argmax(between))
+
+
+def ink_mask(image: Image.Image) -> np.ndarray:
+    """Boolean array, True where a pixel is on the ink side of the Otsu threshold."""
+    gray = np.asarray(image.convert("L"))
+    return gray <= otsu_threshold(gray)
+
+
+def text_line_height(ink: np.ndarray) -> Optional[float]:
+    """
+    Median height in pixels of the horizontal bands that contain ink, i.e. of
+    the text lines. None when fewer than a few lines are found (blank pages,
+    photos).
+    """
+    if ink.size == 0:
+        return None
+
+    rows = ink.sum(axis=1) > max(1, 0.01 * ink.shape[1])
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], rows.astype("int8"), [0]))))
+    heights = edges[1::2] - edges[::2]
+    heights = heights[heights >= 2]
+    if len(heights) < _MIN_LINES:
+        return None
+    return float(np.median(heights))
+
+
+def estimate_skew(ink: np.ndarray) -> float:
+    """
+    Rotation in degrees that straightens the text lines: the angle whose row
+    projection of the ink is the most sharply peaked.
+    """
+    if not ink.any():
+        return 0.0
+
+    mask = Image.fromarray(ink.astype("uint8") * 255)
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-SKEW_MAX_DEGREES, SKEW_MAX_DEGREES + 1e-9, SKEW_STEP_DEGREES):
+        rotated = np.asarray(mask.rotate(float(angle), resample=Image.NEAREST, fillcolor=0))
+        score = float(np.var(rotated.sum(axis=1, dtype="float64")))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+
+def choose_dpi(line_px: Optional[float], probe_size, fallback_dpi: int) -> int:
+    """
+    Render DPI that gives text lines about OCR_TARGET_LINE_PX pixels, clamped
+    to [OCR_MIN_DPI, OCR_MAX_DPI] and to OCR_MAX_SIDE_PX on the longest side.
+    Pages without measurable lines use `fallback_dpi`.
+    """
+    if line_px is None:
+        dpi = float(fallback_dpi)
+    else:
+        dpi = OCR_TARGET_LINE_PX * OCR_PROBE_DPI / line_px
+
+    dpi = min(max(dpi, OCR_MIN_DPI), OCR_MAX_DPI)
+    longest_side_inches = max(probe_size) / OCR_PROBE_DPI
+    if longest_side_inches > 0:
+        dpi = min(dpi, OCR_MAX_SIDE_PX / longest_side_inches)
+    return max(int(round(dpi / 10.0)) * 10, 10)
+
+
+def preprocess(image: Image.Image, skew: float = 0.0) -> Image.Image:
+    """Greyscale, straighten by `skew` degrees if noticeable, and binarize to black on white."""
+    gray = image.convert("L")
+    if abs(skew) >= DESKEW_MIN_DEGREES:
+        gray = gray.rotate(skew, resample=Image.BILINEAR, fillcolor=255)
+
+    threshold = otsu_threshold(np.asarray(gray))
+    return gray.point(lambda v: 0 if v <= threshold else 255)
@@ -1,4 +1,5 @@
 import re
+import logging
 import tempfile
 from concurrent.futures import ThreadPoolExecutor
 import os
@@ -9,31 +10,51 @@ except ImportError:
     from PyPDF2 import PdfReader
     USE_PDFIUM = False
 
-from modules.ocr import extract_text_from_scanned_pdf
+from modules.ocr import ocr_pdf_pages
+
+# A page with fewer non-whitespace characters than this in its text layer...
+OCR_MIN_PAGE_CHARS = int(os.getenv("OCR_MIN_PAGE_CHARS", "25"))
+# ...is OCR'd if images cover at least this fraction of it (blank pages are skipped)
+OCR_MIN_IMAGE_COVERAGE = float(os.getenv("OCR_MIN_IMAGE_COVERAGE", "0.3"))
 
 
 # ============================================================
 #                PDF TEXT EXTRACTION (OPTIMIZED)
 # ============================================================
 
-def extract_text_from_pdf(uploaded_file):
-    """Extract PDF text with optimized parallel processing; fallback to OCR if needed."""
+def extract_pages_with_layout(uploaded_file, progress=None):
+    """
+    Extract cleaned text per page (index 0 is page 1). Pages without a usable
+    text layer (see _pages_needing_ocr) are OCR'd; the whole document is OCR'd
+    if the text layer cannot be read at all.
+    Returns (pages, ocr_layouts) where ocr_layouts maps the 1-based number of
+    every OCR'd page to its word boxes (modules.ocr_layout.PageLayout).
+    `progress` is forwarded to the OCR stage to report pages processed.
+    """
+    ocr_layouts = {}
     with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_pdf:
         temp_pdf.write(uploaded_file.read())
         temp_pdf_path = temp_pdf.name
 
     try:
         if USE_PDFIUM:
-            text = _extract_with_pdfium(temp_pdf_path)
+            pages, image_coverage = _extract_with_pdfium(temp_pdf_path)
         else:
-            text = _extract_with_pypdf2(temp_pdf_path)
-
-        # Fallback to OCR if text is empty or too short
-        if not text.strip() or len(text.strip()) < 50:
-            text = extract_text_from_scanned_pdf(temp_pdf_path)
+            pages = _extract_with_pypdf2(temp_pdf_path)
+            image_coverage = [None] * len(pages)
+
+        ocr_pages = _pages_needing_ocr(pages, image_coverage)
+        logging.info(f"OCR-ing {len(ocr_pages)} of {len(pages)} pages (image-only, no text layer)")
+        if ocr_pages:
+            ocr_texts, layouts = ocr_pdf_pages(temp_pdf_path, progress=progress, pages=ocr_pages)
+            for page in ocr_pages:
+                if page <= len(ocr_texts) and ocr_texts[page - 1].strip():
+                    pages[page - 1] = ocr_texts[page - 1]
+                    if page in layouts:
+                        ocr_layouts[page] = layouts[page]
 
     except Exception:
-        text = extract_text_from_scanned_pdf(temp_pdf_path)
+        pages, ocr_layouts = ocr_pdf_pages(temp_pdf_path, progress=progress)
     finally:
         # Cleanup temp file
         try:
@@ -41,22 +62,92 @@ def extract_text_from_pdf(uploaded_file):
         except:
             pass
 
-    return clean_extracted_text(text)
+    return [clean_extracted_text(page) for page in pages], ocr_layouts
+
+
+def extract_pages_from_pdf(uploaded_file, progress=None):
+    """Extract cleaned text per page (index 0 is page 1); see extract_pages_with_layout."""
+    pages, _ = extract_pages_with_layout(uploaded_file, progress=progress)
+    return pages
+
+
+def join_pages(pages):
+    """
+    Join per-page texts into one document text.
+    Returns (text, page_starts) where page_starts[i] is the offset at which
+    page i + 1 begins (empty pages share the offset of the next page).
+    """
+    parts = []
+    page_starts = []
+    offset = 0
+    for page in pages:
+        page_starts.append(offset)
+        if page:
+            if parts:
+                offset += 1  # separator
+            parts.append(page)
+            page_starts[-1] = offset
+            offset += len(page)
+
+    return " ".join(parts), page_starts
+
+
+def extract_text_from_pdf(uploaded_file, progress=None):
+    """
+    Extract PDF text with optimized parallel processing; fallback to OCR if needed.
+    `progress` is forwarded to the OCR stage to report pages processed.
+    """
+    text, _ = join_pages(extract_pages_from_pdf(uploaded_file, progress=progress))
+    return text
+
+
+def _pages_needing_ocr(page_texts, image_coverage):
+    """
+    1-based numbers of pages whose text layer is (nearly) empty and that are
+    mostly covered by images, i.e. scanned pages. Without coverage information
+    (None, PyPDF2 fallback) every page lacking text is OCR'd.
+    """
+    pages = []
+    for number, (text, coverage) in enumerate(zip(page_texts, image_coverage), start=1):
+        chars = sum(1 for c in text if not c.isspace())
+        if chars >= OCR_MIN_PAGE_CHARS:
+            continue
+        if coverage is None or coverage >= OCR_MIN_IMAGE_COVERAGE:
+            pages.append(number)
+    return pages
+
+
+def _image_coverage(page):
+    """Fraction of the page area covered by image objects (sum of clipped image areas, capped at 1)."""
+    width, height = page.get_size()
+    if width <= 0 or height <= 0:
+        return 0.0
+
+    covered = 0.0
+    for obj in page.get_objects(filter=[pdfium.raw.FPDF_PAGEOBJ_IMAGE], max_depth=2):
+        # get_pos() was renamed get_bounds() in pypdfium2 5
+        left, bottom, right, top = obj.get_bounds() if hasattr(obj, "get_bounds") else obj.get_pos()
+        covered += max(0.0, min(right, width) - max(left, 0.0)) * max(0.0, min(top, height) - max(bottom, 0.0))
+
+    return min(covered / (width * height), 1.0)
 
 
 def _extract_with_pdfium(pdf_path):
-    """Fast extraction using pypdfium2 (3-5x faster than PyPDF2)."""
+    """
+    Fast extraction using pypdfium2 (3-5x faster than PyPDF2).
+    Returns (page texts, image coverage per page).
+    """
     pdf = pdfium.PdfDocument(pdf_path)
     page_texts = []
+    image_coverage = []
     
     for page_num in range(len(pdf)):
         page = pdf[page_num]
         textpage = page.get_textpage()
-        text = textpage.get_text_range()
-        if text:
-            page_texts.append(text)
+        page_texts.append(textpage.get_text_range() or "")
+        image_coverage.append(_image_coverage(page))
     
-    return "\n".join(page_texts)
+    return page_texts, image_coverage
 
 
 def _extract_with_pypdf2(pdf_path):
@@ -72,7 +163,7 @@ def _extract_with_pypdf2(pdf_path):
     else:
         page_texts = [page.extract_text() or "" for page in reader.pages]
     
-    return "\n".join(page_texts)
+    return page_texts
 
 
 def clean_extracted_text(text):
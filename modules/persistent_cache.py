@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+from modules.config import CACHE_DIR
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+EVICTION_POLICIES = ("lru", "fifo")
+
+# SQLite limits the number of bound parameters per statement
+_SQL_CHUNK = 500
+
+_CACHES: Dict[str, "PersistentCache"] = {}
+
+
+class PersistentCache:
+    """
+    SQLite-backed key/value cache with TTL and LRU/FIFO eviction, bounded by
+    entry count and optionally by total size of the stored values (max_bytes).
+
+    Values are stored as JSON. The database lives in CACHE_DIR and is shared by
+    every worker process on the machine (WAL mode allows concurrent readers).
+    """
+
+    def __init__(self, name: str, max_entries: int = 10000, ttl_seconds: Optional[float] = None,
+                 eviction: str = "lru", path: Optional[str] = None, max_bytes: Optional[int] = None):
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy '{eviction}', expected one of {EVICTION_POLICIES}")
+
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.eviction = eviction
+        self.path = path or os.path.join(CACHE_DIR, f"{name}.sqlite3")
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL,"
+            " size INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(entries)")}
+        if "size" not in columns:
+            # Databases created before size accounting
+            self._conn.execute("ALTER TABLE entries ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute("UPDATE entries SET size = LENGTH(CAST(value AS BLOB))")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON entries(accessed_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_created ON entries(created_at)")
+        self._conn.commit()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        register_cache(name, self)
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Return the cached values for the keys that are present and fresh."""
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+
+        now = time.time()
+        found: Dict[str, Any] = {}
+        expired = []
+
+        with self._lock:
+            for i in range(0, len(keys), _SQL_CHUNK):
+                chunk = keys[i:i + _SQL_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, value, created_at FROM entries WHERE key IN ({placeholders})",
+                    chunk
+                ).fetchall()
+
+                for key, value, created_at in rows:
+                    if self._is_expired(created_at, now):
+                        expired.append(key)
+                        continue
+                    try:
+                        found[key] = json.loads(value)
+                    except json.JSONDecodeError:
+                        expired.append(key)
+
+            if found and self.eviction == "lru":
+                self._conn.executemany(
+                    "UPDATE entries SET accessed_at = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+            if expired:
+                self._conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in expired])
+                self.evictions += len(expired)
+            if found or expired:
+                self._conn.commit()
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+
+        return found
+
+    def set(self, key: str, value: Any) -> None:
+        self.set_many({key: value})
+
+    def set_many(self, items: Dict[str, Any]) -> None:
+        if not items:
+            return
+
+        now = time.time()
+        rows = []
+        for key, value in items.items():
+            encoded = json.dumps(value)
+            rows.append((key, encoded, now, now, len(encoded.encode("utf-8"))))
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries (key, value, created_at, accessed_at, size) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        """
+        Drop expired entries, then the least recently used (or oldest) beyond
+        max_entries, then more of them until the values fit in max_bytes.
+        """
+        if self.ttl_seconds is not None:
+            cursor = self._conn.execute(
+                "DELETE FROM entries WHERE created_at < ?", (now - self.ttl_seconds,)
+            )
+            self.evictions += max(cursor.rowcount, 0)
+
+        count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        overflow = count - self.max_entries
+        order_column = "accessed_at" if self.eviction == "lru" else "created_at"
+        if overflow > 0:
+            self._conn.execute(
+                f"DELETE FROM entries WHERE key IN "
+                f"(SELECT key FROM entries ORDER BY {order_column} ASC LIMIT ?)",
+                (overflow,)
+            )
+            self.evictions += overflow
+
+        if self.max_bytes is not None:
+            excess = self._total_bytes() - self.max_bytes
+            if excess > 0:
+                victims = []
+                for key, size in self._conn.execute(f"SELECT key, size FROM entries ORDER BY {order_column} ASC"):
+                    victims.append((key,))
+                    excess -= size
+                    if excess <= 0:
+                        break
+                self._conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+                self.evictions += len(victims)
+
+    def _total_bytes(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        stats = {
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+        if self.max_bytes is not None:
+            with self._lock:
+                stats["bytes"] = self._total_bytes()
+            stats["max_bytes"] = self.max_bytes
+        return stats
+
+
+def register_cache(name: str, cache: Any) -> None:
+    """Include a cache (anything with a stats() method) in cache_stats()."""
+    _CACHES[name] = cache
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Hit/miss counters for every persistent cache created in this process."""
+    return {name: cache.stats() for name, cache in _CACHES.items()}
@@ -0,0 +1,159 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Groq quota for llama-3.1-8b-instant (override per account tier)
+GROQ_REQUESTS_PER_MINUTE = int(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30"))
+GROQ_TOKENS_PER_MINUTE = int(os.getenv("GROQ_TOKENS_PER_MINUTE", "6000"))
+
+
+class TokenBucketLimiter:
+    """
+    Dual token bucket modelling a requests-per-minute and a tokens-per-minute quota.
+
+    State is guarded by a threading lock and waiting is done outside it, so one
+    limiter can be shared by sync callers in worker threads and async callers
+    running on any event loop.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests_per_minute = max(1, requests_per_minute)
+        self.tokens_per_minute = max(1, tokens_per_minute)
+
+        self._request_budget = float(self.requests_per_minute)
+        self._token_budget = float(self.tokens_per_minute)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+        self._acquired = 0
+        self._waited_seconds = 0.0
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        self._request_budget = min(
+            self.requests_per_minute,
+            self._request_budget + elapsed * self.requests_per_minute / 60.0
+        )
+        self._token_budget = min(
+            self.tokens_per_minute,
+            self._token_budget + elapsed * self.tokens_per_minute / 60.0
+        )
+
+    def _reserve(self, tokens: int) -> float:
+        """Take one request + `tokens` from the buckets, or return how long to wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+
+            if now < self._blocked_until:
+                return self._blocked_until - now
+
+            # A single oversized request must not wait forever
+            tokens = min(tokens, self.tokens_per_minute)
+
+            if self._request_budget >= 1 and self._token_budget >= tokens:
+                self._request_budget -= 1
+                self._token_budget -= tokens
+                self._acquired += 1
+                return 0.0
+
+            wait_requests = max(0.0, (1 - self._request_budget) * 60.0 / self.requests_per_minute)
+            wait_tokens = max(0.0, (tokens - self._token_budget) * 60.0 / self.tokens_per_minute)
+            return max(wait_requests, wait_tokens)
+
+    def acquire(self, tokens: int = 0) -> None:
+        """Block the calling thread until the request fits the quota."""
+        while True:
+            wait = self._reserve(tokens)
+            if wait <= 0:
+                return
+            self._waited_seconds += wait
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: int = 0) -> None:
+        """Await until the request fits the quota without blocking the event loop."""
+        while True:
+            wait = self._reserve(tokens)
+            if wait <= 0:
+                return
+            self._waited_seconds += wait
+            await asyncio.sleep(wait)
+
+    def block_for(self, seconds: float) -> None:
+        """Pause all callers, e.g. after the server answered 429 with Retry-After."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "requests_per_minute": self.requests_per_minute,
+                "tokens_per_minute": self.tokens_per_minute,
+                "available_requests": round(self._request_budget, 2),
+                "available_tokens": round(self._token_budget, 1),
+                "acquired": self._acquired,
+                "waited_seconds": round(self._waited_seconds, 2),
+            }
+
+
+_GROQ_LIMITER: Optional[TokenBucketLimiter] = None
+_GROQ_LIMITER_LOCK = threading.Lock()
+
+
+def get_groq_limiter() -> TokenBucketLimiter:
+    """Process-wide limiter shared by every Groq caller."""
+    global _GROQ_LIMITER
+    if _GROQ_LIMITER is None:
+        with _GROQ_LIMITER_LOCK:
+            if _GROQ_LIMITER is None:
+                _GROQ_LIMITER = TokenBucketLimiter(GROQ_REQUESTS_PER_MINUTE, GROQ_TOKENS_PER_MINUTE)
+    return _GROQ_LIMITER
+
+
+def estimate_tokens(prompt: str, max_tokens: int = 0) -> int:
+    """Rough token estimate (~4 chars per token) for prompt plus completion budget."""
+    return len(prompt) // 4 + max_tokens
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read the Retry-After header (seconds or HTTP date) from an API error, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    value = headers.get("retry-after")
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None,
+                  base: float = 1.0, cap: float = 15.0) -> float:
+    """
+    Delay before retry `attempt` (0-based).
+    Honours the server's Retry-After when present, otherwise uses full-jitter
+    exponential backoff so concurrent callers do not retry in lockstep.
+    """
+    if retry_after is not None:
+        return retry_after + random.uniform(0, base)
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
@@ -1,16 +1,22 @@
 import os
-import time
+import asyncio
+import hashlib
 import logging
-from typing import List, Dict, Optional
-from groq import Groq
+from typing import Callable, List, Dict, Optional
+from groq import AsyncGroq
 from groq import RateLimitError, APIError
 from sentence_transformers import SentenceTransformer
 import numpy as np
 
+from modules.model_registry import get_sentence_model
+from modules.rate_limiter import get_groq_limiter, estimate_tokens, retry_after_seconds, backoff_delay
+from modules.persistent_cache import PersistentCache
+from modules.utils.async_runner import run_sync
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Initialize Groq client
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+SCORING_MODEL = "llama-3.1-8b-instant"
 
 # Legal concept keywords for semantic filtering
 LEGAL_CONCEPTS = [
@@ -24,44 +30,104 @@ LEGAL_CONCEPTS = [
 
 # Retry configuration
 MAX_RETRIES = 4
-RETRY_DELAYS = [2, 4, 8, 15]  # Exponential backoff in seconds
+RETRY_BASE_DELAY = 2  # Jittered exponential backoff in seconds
+RETRY_MAX_DELAY = 15
 BATCH_SIZE = 10  # Process 10 paragraphs per batch
+SCORE_MAX_TOKENS = 100
+MAX_CONCURRENT_BATCHES = int(os.getenv("GROQ_MAX_CONCURRENT_BATCHES", "4"))  # Batches in flight
+
+# Score cache configuration. Bump PROMPT_VERSION whenever _create_batch_prompt changes
+# so scores produced by an older prompt are not reused.
+PROMPT_VERSION = "importance-v1"
+SCORE_CACHE_MAX_ENTRIES = int(os.getenv("SCORE_CACHE_MAX_ENTRIES", "200000"))
+SCORE_CACHE_TTL_DAYS = float(os.getenv("SCORE_CACHE_TTL_DAYS", "30"))
+
+# Semantic filtering configuration
+MIN_PARAGRAPH_LENGTH = 40
+RELEVANCE_THRESHOLD = 0.3
 
 
 def load_semantic_model() -> Optional[SentenceTransformer]:
-    """Load sentence transformer for semantic understanding."""
+    """Return the shared sentence transformer (loaded once per process)."""
     try:
-        model = SentenceTransformer('all-MiniLM-L6-v2')
-        logging.info("Semantic model loaded successfully")
-        return model
+        return get_sentence_model()
     except Exception as e:
         logging.error(f"Failed to load semantic model: {e}")
         return None
 
 
-def check_legal_relevance(paragraph: str, model: SentenceTransformer, threshold: float = 0.3) -> bool:
+# Concept embeddings are fixed for a given model, so they are computed once per
+# process and reused by every relevance check.
+_CONCEPT_MATRIX: Optional[np.ndarray] = None
+_CONCEPT_MODEL_ID: Optional[int] = None
+
+_SCORE_CACHE: Optional[PersistentCache] = None
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize each row of a 2D array (zero rows are left as zeros)."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def get_concept_matrix(model: SentenceTransformer) -> np.ndarray:
+    """Return the normalized (n_concepts, dim) embedding matrix for LEGAL_CONCEPTS."""
+    global _CONCEPT_MATRIX, _CONCEPT_MODEL_ID
+
+    if _CONCEPT_MATRIX is None or _CONCEPT_MODEL_ID != id(model):
+        embeddings = model.encode(LEGAL_CONCEPTS, convert_to_numpy=True, show_progress_bar=False)
+        _CONCEPT_MATRIX = _normalize_rows(embeddings)
+        _CONCEPT_MODEL_ID = id(model)
+        logging.info(f"Cached embeddings for {len(LEGAL_CONCEPTS)} legal concepts")
+
+    return _CONCEPT_MATRIX
+
+
+def compute_legal_relevance(
+    paragraphs: List[str],
+    model: SentenceTransformer,
+    threshold: float = RELEVANCE_THRESHOLD,
+    batch_size: int = 64
+) -> np.ndarray:
     """
-    Check if paragraph discusses legal concepts using semantic similarity.
-    Returns True if paragraph is legally relevant.
+    Batched relevance check for many paragraphs.
+    Encodes all paragraphs in one call and scores them against the cached
+    concept matrix with a single matrix multiply.
+    Returns a boolean mask aligned with `paragraphs`.
     """
-    if not paragraph or not model:
-        return False
-    
+    if not paragraphs or not model:
+        return np.zeros(len(paragraphs), dtype=bool)
+
     try:
-        para_embedding = model.encode(paragraph, convert_to_tensor=False)
-        concept_embeddings = model.encode(LEGAL_CONCEPTS, convert_to_tensor=False)
-        
-        para_norm = para_embedding / np.linalg.norm(para_embedding)
-        concept_norms = concept_embeddings / np.linalg.norm(concept_embeddings, axis=1, keepdims=True)
-        
-        similarities = np.dot(concept_norms, para_norm)
-        max_similarity = np.max(similarities)
-        
+        concept_matrix = get_concept_matrix(model)
+        para_embeddings = model.encode(
+            paragraphs,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        para_matrix = _normalize_rows(para_embeddings)
+
+        # (n_paragraphs, dim) @ (dim, n_concepts) -> best concept match per paragraph
+        max_similarity = (para_matrix @ concept_matrix.T).max(axis=1)
         return max_similarity >= threshold
     except Exception as e:
-        logging.error(f"Error in semantic check: {e}")
+        logging.error(f"Error in batched semantic check: {e}")
+        return np.zeros(len(paragraphs), dtype=bool)
+
+
+def check_legal_relevance(paragraph: str, model: SentenceTransformer, threshold: float = RELEVANCE_THRESHOLD) -> bool:
+    """
+    Check if paragraph discusses legal concepts using semantic similarity.
+    Returns True if paragraph is legally relevant.
+    """
+    if not paragraph or not model:
         return False
 
+    return bool(compute_legal_relevance([paragraph], model, threshold)[0])
+
 
 def _create_batch_prompt(paragraphs: List[str]) -> str:
     """Create a batched prompt for multiple paragraphs."""
@@ -102,20 +168,25 @@ def _validate_batch_response(response_text: str, expected_count: int) -> Optiona
         return None
 
 
-def _score_batch_with_retry(paragraphs: List[str]) -> List[int]:
+async def _score_batch_with_retry(client: AsyncGroq, paragraphs: List[str]) -> Optional[List[int]]:
     """
-    Score a batch of paragraphs with exponential backoff retry logic.
-    Returns list of scores (1-3) for each paragraph.
+    Score a batch of paragraphs with jittered backoff retry logic.
+    Every attempt first takes its share of the shared Groq rate limiter.
+    Returns list of scores (1-3) for each paragraph, or None if every attempt failed.
     """
+    limiter = get_groq_limiter()
     prompt = _create_batch_prompt(paragraphs)
+    estimated_tokens = estimate_tokens(prompt, SCORE_MAX_TOKENS)
     
     for attempt in range(MAX_RETRIES):
+        await limiter.acquire_async(estimated_tokens)
+
         try:
-            response = client.chat.completions.create(
-                model="llama-3.1-8b-instant",
+            response = await client.chat.completions.create(
+                model=SCORING_MODEL,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.1,
-                max_tokens=100
+                max_tokens=SCORE_MAX_TOKENS
             )
             
             response_text = response.choices[0].message.content.strip()
@@ -127,33 +198,127 @@ def _score_batch_with_retry(paragraphs: List[str]) -> List[int]:
             logging.warning(f"Invalid response format, attempt {attempt + 1}/{MAX_RETRIES}")
             
         except RateLimitError as e:
+            retry_after = retry_after_seconds(e)
+            if retry_after is not None:
+                limiter.block_for(retry_after)
+
             if attempt < MAX_RETRIES - 1:
-                delay = RETRY_DELAYS[attempt]
-                logging.warning(f"Rate limit hit. Retrying in {delay}s... (attempt {attempt + 1}/{MAX_RETRIES})")
-                time.sleep(delay)
+                delay = backoff_delay(attempt, retry_after, RETRY_BASE_DELAY, RETRY_MAX_DELAY)
+                logging.warning(f"Rate limit hit. Retrying in {delay:.1f}s... (attempt {attempt + 1}/{MAX_RETRIES})")
+                await asyncio.sleep(delay)
             else:
                 logging.error(f"Rate limit exceeded after {MAX_RETRIES} attempts")
-                return [1] * len(paragraphs)
+                return None
         
         except APIError as e:
             if attempt < MAX_RETRIES - 1:
-                delay = RETRY_DELAYS[attempt]
-                logging.warning(f"API error: {e}. Retrying in {delay}s...")
-                time.sleep(delay)
+                delay = backoff_delay(attempt, None, RETRY_BASE_DELAY, RETRY_MAX_DELAY)
+                logging.warning(f"API error: {e}. Retrying in {delay:.1f}s...")
+                await asyncio.sleep(delay)
             else:
                 logging.error(f"API error after {MAX_RETRIES} attempts: {e}")
-                return [1] * len(paragraphs)
+                return None
         
         except Exception as e:
             logging.error(f"Unexpected error in batch scoring: {e}")
-            return [1] * len(paragraphs)
+            return None
     
     # Fallback if all retries failed
     logging.error("All retry attempts failed, returning default scores")
-    return [1] * len(paragraphs)
+    return None
+
+
+async def _score_batches_async(batches: List[List[str]],
+                               progress: Optional[Callable] = None) -> List[Optional[List[int]]]:
+    """
+    Score batches concurrently, keeping at most MAX_CONCURRENT_BATCHES in flight.
+    Results come back in the same order as `batches`.
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_BATCHES)
+    total_batches = len(batches)
+    batches_done = 0
+
+    async with AsyncGroq(api_key=GROQ_API_KEY) as client:
+        async def score(batch_num: int, batch: List[str]) -> Optional[List[int]]:
+            async with semaphore:
+                logging.info(f"Processing batch {batch_num}/{total_batches} ({len(batch)} paragraphs)...")
+                scores = await _score_batch_with_retry(client, batch)
+
+            nonlocal batches_done
+            batches_done += 1
+            if progress:
+                progress("scoring", {"batches_done": batches_done, "total_batches": total_batches})
+            return scores
+
+        return await asyncio.gather(
+            *(score(i, batch) for i, batch in enumerate(batches, 1))
+        )
+
+
+def get_score_cache() -> PersistentCache:
+    """Persistent cache of LLM importance scores, shared across uploads and workers."""
+    global _SCORE_CACHE
+    if _SCORE_CACHE is None:
+        _SCORE_CACHE = PersistentCache(
+            "importance_scores",
+            max_entries=SCORE_CACHE_MAX_ENTRIES,
+            ttl_seconds=SCORE_CACHE_TTL_DAYS * 86400
+        )
+    return _SCORE_CACHE
+
+
+def _score_cache_key(paragraph: str) -> str:
+    """Content address of a paragraph for a given scoring model and prompt version."""
+    normalized = " ".join(paragraph.lower().split())
+    payload = f"{SCORING_MODEL}\x00{PROMPT_VERSION}\x00{normalized}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def score_paragraphs(paragraphs: List[str], progress: Optional[Callable] = None) -> List[int]:
+    """
+    Score paragraphs with Groq in concurrent batches; returns one score per paragraph.
+    Cached scores are reused and only distinct cache misses are sent to the API.
+    `progress`, if given, is called as progress("scoring", {...}) after each batch.
+    """
+    if not paragraphs:
+        return []
+
+    cache = get_score_cache()
+    keys = [_score_cache_key(para) for para in paragraphs]
+    scores_by_key = cache.get_many(keys)
+
+    # Repeated boilerplate inside one document is scored once
+    missing = {}
+    for key, para in zip(keys, paragraphs):
+        if key not in scores_by_key and key not in missing:
+            missing[key] = para
+
+    cached_count = sum(1 for key in keys if key in scores_by_key)
+    logging.info(f"Score cache: {cached_count} hits, {len(missing)} paragraphs to score")
+
+    if missing:
+        miss_keys = list(missing)
+        miss_paragraphs = list(missing.values())
+        batches = [
+            miss_paragraphs[i:i + BATCH_SIZE]
+            for i in range(0, len(miss_paragraphs), BATCH_SIZE)
+        ]
+        batch_scores = run_sync(_score_batches_async(batches, progress))
+
+        fresh = {}
+        for batch_idx, scores in enumerate(batch_scores):
+            if scores is None:
+                continue  # failed batches fall back to the default score and are not cached
+            batch_keys = miss_keys[batch_idx * BATCH_SIZE:(batch_idx + 1) * BATCH_SIZE]
+            fresh.update(zip(batch_keys, scores))
+
+        cache.set_many(fresh)
+        scores_by_key.update(fresh)
 
+    return [scores_by_key.get(key, 1) for key in keys]
 
-def analyze_paragraphs_hybrid(paragraphs: List[str]) -> List[Dict]:
+
+def analyze_paragraphs_hybrid(paragraphs: List[str], progress: Optional[Callable] = None) -> List[Dict]:
     """
     Hybrid analysis: semantic filtering + batched Groq scoring with retry logic.
     
@@ -172,49 +337,27 @@ def analyze_paragraphs_hybrid(paragraphs: List[str]) -> List[Dict]:
         logging.error("Semantic model failed to load, using fallback")
         return _fallback_analysis(paragraphs)
     
-    # Step 1: Filter legally relevant paragraphs
-    legal_paragraphs = []
-    paragraph_map = {}  # Maps index to original paragraph
-    
-    for i, para in enumerate(paragraphs):
-        if not para or len(para.strip()) < 40:
-            continue
-        
-        is_legal = check_legal_relevance(para, semantic_model)
-        
-        if is_legal:
-            legal_paragraphs.append(para)
-            paragraph_map[len(legal_paragraphs) - 1] = i
-    
+    # Step 1: Filter legally relevant paragraphs (one batched encode for the document)
+    candidates = [
+        para for para in paragraphs
+        if para and len(para.strip()) >= MIN_PARAGRAPH_LENGTH
+    ]
+    relevance_mask = compute_legal_relevance(candidates, semantic_model)
+
+    legal_paragraphs = [para for para, is_legal in zip(candidates, relevance_mask) if is_legal]
+
     logging.info(f"Filtered to {len(legal_paragraphs)} legally-relevant paragraphs")
     
-    # Step 2: Batch score legal paragraphs
-    all_scores = []
-    total_batches = (len(legal_paragraphs) + BATCH_SIZE - 1) // BATCH_SIZE
+    # Step 2: Batch score legal paragraphs (concurrent, rate limited)
+    all_scores = score_paragraphs(legal_paragraphs, progress)
     
-    for batch_idx in range(0, len(legal_paragraphs), BATCH_SIZE):
-        batch = legal_paragraphs[batch_idx:batch_idx + BATCH_SIZE]
-        batch_num = batch_idx // BATCH_SIZE + 1
-        
-        logging.info(f"Processing batch {batch_num}/{total_batches} ({len(batch)} paragraphs)...")
-        
-        scores = _score_batch_with_retry(batch)
-        all_scores.extend(scores)
-        
-        # Rate limiting: small delay between batches
-        if batch_idx + BATCH_SIZE < len(legal_paragraphs):
-            time.sleep(0.5)
-    
-    # Step 3: Build results
+    # Step 3: Build results, reusing the relevance mask from step 1
     results = []
     score_idx = 0
     
-    for i, para in enumerate(paragraphs):
-        if not para or len(para.strip()) < 40:
-            continue
-        
-        is_legal = check_legal_relevance(para, semantic_model)
-        
+    for para, is_legal in zip(candidates, relevance_mask):
+        is_legal = bool(is_legal)
+
         if is_legal and score_idx < len(all_scores):
             score = all_scores[score_idx]
             score_idx += 1
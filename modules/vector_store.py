@@ -1,26 +1,137 @@
-import faiss
-import numpy as np
-from sentence_transformers import SentenceTransformer
-
-# Load model once globally
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
-
-def create_faiss_index(text, chunk_size=500, overlap=100):
-    """Split text into chunks and build FAISS index."""
-    chunks = []
-    for i in range(0, len(text), chunk_size - overlap):
-        chunks.append(text[i:i + chunk_size])
-
-    embeddings = embedder.encode(chunks, show_progress_bar=True)
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dim)
-    index.add(np.array(embeddings).astype("float32"))
-
-    return index, chunks
-
-def search_similar_chunks(query, index, chunks, top_k=3):
-    """Return top_k most similar chunks for a query."""
-    query_vec = embedder.encode([query])
-    D, I = index.search(np.array(query_vec).astype("float32"), top_k)
-    results = [chunks[i] for i in I[0]]
+import os
+import time
+
+from modules.model_registry import get_sentence_model, SENTENCE_MODEL_ID
+from modules.index_factory import build_index, search_index, normalize
+from modules.corpus_index import get_corpus
+from modules.embedding_cache import get_embedding_cache, encode_cached
+from modules.chunker import chunk_document
+from modules.bm25 import BM25Index
+
+# Default retrieval for chat; callers may pick per query
+RETRIEVAL_MODES = ("vector", "bm25", "hybrid")
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+
+# Reciprocal rank fusion constant and candidate depth per ranking
+RRF_K = 60
+RRF_DEPTH_FACTOR = 4
+RRF_MIN_DEPTH = 20
+
+def get_embedder():
+    """Shared MiniLM embedder (same instance used by importance scoring)."""
+    return get_sentence_model()
+
+def embed_chunks(texts, show_progress_bar=False):
+    """Embed chunk texts, encoding only those missing from the embedding cache."""
+    embedder = get_embedder()
+    cache = get_embedding_cache(SENTENCE_MODEL_ID, embedder.get_sentence_embedding_dimension())
+    return encode_cached(
+        list(texts),
+        lambda batch: embedder.encode(batch, show_progress_bar=show_progress_bar),
+        cache
+    )
+
+def embed_query(query):
+    """Normalized (1, dim) float32 embedding of a query."""
+    return normalize(get_embedder().encode([query]))
+
+def build_document_index(text, page_starts=None, index_config=None):
+    """
+    Chunk text along paragraph and sentence boundaries and build a FAISS index.
+    The index type (Flat, HNSW or IVF-PQ) is chosen from the chunk count
+    unless `index_config` sets it; see modules.index_factory.
+    Returns (index, chunks, resolved config) with chunk dicts from
+    modules.chunker.chunk_document; keep the config with the index, since
+    query-time settings (efSearch, nprobe) are not saved in the index file.
+    """
+    chunks = chunk_document(text, page_starts)
+
+    embeddings = embed_chunks([c["text"] for c in chunks], show_progress_bar=True)
+    index, config = build_index(embeddings, index_config, model_id=SENTENCE_MODEL_ID)
+
+    return index, chunks, config
+
+def create_faiss_index(text, page_starts=None, index_config=None):
+    """Split text into chunks and build FAISS index. Returns (index, chunk texts)."""
+    index, chunks, _ = build_document_index(text, page_starts, index_config)
+    return index, [c["text"] for c in chunks]
+
+def open_corpus(corpus_id):
+    """Corpus index for `corpus_id`, sized for the shared embedder."""
+    dim = get_embedder().get_sentence_embedding_dimension()
+    return get_corpus(corpus_id, dim, SENTENCE_MODEL_ID)
+
+def add_document_to_corpus(corpus_id, doc_id, text, filename=None, page_starts=None):
+    """Chunk, embed and add a document's text to a corpus. Returns the chunk count."""
+    chunks = chunk_document(text, page_starts)
+    embeddings = embed_chunks([c["text"] for c in chunks])
+    return open_corpus(corpus_id).add_document(doc_id, chunks, embeddings, filename=filename)
+
+def search_similar_chunks(query, index=None, chunks=None, top_k=3, corpus_id=None):
+    """
+    Return top_k most similar chunks for a query (cosine similarity).
+
+    With `corpus_id`, searches that corpus instead of a single document index and
+    returns hits with source attribution (doc_id, filename, page, start, end, score).
+    """
+    query_vec = get_embedder().encode([query])
+    if corpus_id is not None:
+        return open_corpus(corpus_id).search(query_vec, top_k)
+
+    results = [chunks[i] for i, _ in search_chunk_ids(query_vec, index, top_k, len(chunks))]
     return results
+
+def search_chunk_ids(query_vec, index, top_k, n_chunks):
+    """(chunk id, cosine score) pairs for an already-encoded query."""
+    scores, ids = search_index(index, query_vec, top_k)
+    return [(i, s) for i, s in zip(ids[0], scores[0]) if i < n_chunks]
+
+def build_bm25_index(chunks):
+    """Sparse BM25 index over chunk texts (same ids as the FAISS index)."""
+    return BM25Index.build(chunks)
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Fuse ranked id lists: score(id) = sum over rankings of 1 / (k + rank)."""
+    fused = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: -item[1])
+
+def hybrid_search(query, index, n_chunks, bm25=None, top_k=3, mode=None, query_vec=None):
+    """
+    Rank chunk ids for a query with "vector", "bm25" or "hybrid" (RRF of both) retrieval.
+    Falls back to vector search when no BM25 index is available. Pass
+    `query_vec` when the query was already embedded.
+    Returns ([(chunk id, score)], stats) with per-step latencies in milliseconds.
+    """
+    mode = mode or RETRIEVAL_MODE
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode '{mode}', expected one of {RETRIEVAL_MODES}")
+    if bm25 is None:
+        mode = "vector"
+
+    stats = {"mode": mode}
+    depth = top_k if mode != "hybrid" else max(top_k * RRF_DEPTH_FACTOR, RRF_MIN_DEPTH)
+
+    vector_hits, sparse_hits = [], []
+    if mode in ("vector", "hybrid"):
+        start = time.perf_counter()
+        if query_vec is None:
+            query_vec = embed_query(query)
+        vector_hits = search_chunk_ids(query_vec, index, depth, n_chunks)
+        stats["vector_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    if mode in ("bm25", "hybrid"):
+        start = time.perf_counter()
+        sparse_hits = [(i, s) for i, s in bm25.search(query, depth) if i < n_chunks]
+        stats["bm25_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+    if mode == "vector":
+        return vector_hits[:top_k], stats
+    if mode == "bm25":
+        return sparse_hits[:top_k], stats
+
+    start = time.perf_counter()
+    fused = reciprocal_rank_fusion([[i for i, _ in vector_hits], [i for i, _ in sparse_hits]])
+    stats["fusion_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return fused[:top_k], stats
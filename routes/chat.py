@@ -1,28 +1,120 @@
+import json
+import time
+from typing import Any, Dict, List, Optional
+
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
-from services.chat_service import chat_with_document
+from services.chat_service import chat_with_document, chat_with_corpus, prepare_chat_context, stream_chat_answer
 
 router = APIRouter()
 
 class ChatRequest(BaseModel):
-    session_id: str
     query: str
+    session_id: Optional[str] = None
+    corpus_id: Optional[str] = None  # chat across a corpus instead of one document
+    retrieval: Optional[str] = None  # "vector", "bm25" or "hybrid" (default RETRIEVAL_MODE)
 
 class ChatResponse(BaseModel):
     answer: str
-    session_id: str
+    session_id: Optional[str] = None
+    corpus_id: Optional[str] = None
+    sources: Optional[List[Dict[str, Any]]] = None
+    retrieval: Optional[Dict[str, Any]] = None
 
 @router.post("/", response_model=ChatResponse)
 async def chat(request: ChatRequest):
-    """Chat with the uploaded document"""
+    """Chat with the uploaded document, or with a corpus of documents"""
+    if not request.session_id and not request.corpus_id:
+        raise HTTPException(status_code=400, detail="Provide a session_id or a corpus_id")
+
     try:
-        answer = chat_with_document(request.session_id, request.query)
+        if request.corpus_id:
+            answer, sources = await run_in_threadpool(chat_with_corpus, request.corpus_id, request.query)
+            return ChatResponse(answer=answer, corpus_id=request.corpus_id, sources=sources)
+
+        answer, sources, retrieval = await run_in_threadpool(
+            chat_with_document, request.session_id, request.query, request.retrieval
+        )
         
         return ChatResponse(
             answer=answer,
-            session_id=request.session_id
+            session_id=request.session_id,
+            sources=sources,
+            retrieval=retrieval
         )
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Stream the answer as server-sent events: one "sources" event, "token"
+    events as the model generates, then a "done" event with time to first
+    token and total latency. Retrieval finishes before the stream opens and
+    its timings are sent as response headers. A semantic answer cache hit is
+    sent as a single "token" event without calling the model.
+    """
+    if not request.session_id and not request.corpus_id:
+        raise HTTPException(status_code=400, detail="Provide a session_id or a corpus_id")
+
+    started = time.perf_counter()
+    try:
+        plan = await run_in_threadpool(
+            prepare_chat_context, request.query, request.session_id, request.corpus_id, request.retrieval
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=404 if "not found" in str(e) else 400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    retrieval_ms = round((time.perf_counter() - started) * 1000, 2)
+    sources, retrieval = plan["sources"], plan["retrieval"]
+
+    def event_stream():
+        yield _sse("sources", {"sources": sources, "retrieval": retrieval})
+
+        first_token_ms = None
+        pieces: List[str] = []
+        if plan["cached_answer"] is not None:
+            first_token_ms = round((time.perf_counter() - started) * 1000, 2)
+            pieces.append(plan["cached_answer"])
+            yield _sse("token", {"text": plan["cached_answer"]})
+        else:
+            try:
+                # Sync iterator: Starlette drives it from a worker thread
+                for piece in stream_chat_answer(request.query, plan["context"]):
+                    if first_token_ms is None:
+                        first_token_ms = round((time.perf_counter() - started) * 1000, 2)
+                    pieces.append(piece)
+                    yield _sse("token", {"text": piece})
+                if plan["remember"] is not None:
+                    plan["remember"]("".join(pieces).strip())
+            except Exception as e:
+                yield _sse("error", {"error": str(e)})
+
+        yield _sse("done", {
+            "retrieval_ms": retrieval_ms,
+            "ttft_ms": first_token_ms,
+            "total_ms": round((time.perf_counter() - started) * 1000, 2),
+            "tokens": len(pieces),
+            "cache": retrieval.get("cache"),
+        })
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "X-Retrieval-Mode": retrieval.get("mode", ""),
+            "X-Retrieval-Ms": str(retrieval_ms),
+        }
+    )
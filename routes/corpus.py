@@ -0,0 +1,63 @@
+from typing import Any, Dict, List
+
+from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+
+from services.corpus_service import (
+    add_session_to_corpus,
+    remove_document_from_corpus,
+    get_corpus_info,
+    search_corpus
+)
+
+router = APIRouter()
+
+class AddDocumentRequest(BaseModel):
+    session_id: str
+
+class SearchRequest(BaseModel):
+    query: str
+    top_k: int = 5
+
+@router.post("/{corpus_id}/documents")
+async def add_document(corpus_id: str, request: AddDocumentRequest):
+    """Add an uploaded document (by session id) to a corpus"""
+    try:
+        return await run_in_threadpool(add_session_to_corpus, corpus_id, request.session_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404 if "not found" in str(e) else 400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/{corpus_id}/documents/{doc_id}")
+async def remove_document(corpus_id: str, doc_id: str):
+    """Remove a document from a corpus"""
+    try:
+        if not await run_in_threadpool(remove_document_from_corpus, corpus_id, doc_id):
+            raise HTTPException(status_code=404, detail="Document not found in corpus")
+        return {"message": "Document removed from corpus"}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{corpus_id}")
+async def corpus_info(corpus_id: str):
+    """Corpus statistics and document list"""
+    try:
+        return await run_in_threadpool(get_corpus_info, corpus_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.post("/{corpus_id}/search")
+async def search(corpus_id: str, request: SearchRequest) -> Dict[str, List[Dict[str, Any]]]:
+    """Most relevant chunks across the corpus, with their source documents"""
+    try:
+        return {"results": await run_in_threadpool(search_corpus, corpus_id, request.query, request.top_k)}
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,5 +1,8 @@
 from fastapi import APIRouter
-from services.pdf_service import kw_model
+from modules.model_registry import KEYWORD_MODEL, is_loaded, model_stats
+from modules.persistent_cache import cache_stats
+from services.worker_pool import get_pipeline_pool
+from services.pdf_service import session_store_stats
 
 router = APIRouter()
 
@@ -14,5 +17,9 @@ async def health_check():
     return {
         "status": "healthy",
         "message": "LawLens backend running",
-        "models_loaded": kw_model is not None
+        "models_loaded": is_loaded(KEYWORD_MODEL),
+        "models": model_stats(),
+        "caches": cache_stats(),
+        "pipeline_pool": get_pipeline_pool().stats(),
+        "session_store": session_store_stats()
     }
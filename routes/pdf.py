@@ -1,6 +1,9 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
+import asyncio
 import tempfile
+import json
 import os
 
 from services.pdf_service import (
@@ -11,9 +14,25 @@ from services.pdf_service import (
     get_keywords_text,
     get_raw_text
 )
+from services.worker_pool import get_pipeline_pool, PoolSaturatedError
+from services.job_service import create_job, get_job
 
 router = APIRouter()
 
+# How often the SSE stream checks the shared job store for new events
+JOB_EVENT_POLL_SECONDS = 0.25
+
+
+def _busy_error(e: PoolSaturatedError) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail={
+            "message": "Server is busy processing other documents, please retry shortly",
+            "queue_depth": e.queue_depth,
+        },
+        headers={"Retry-After": "10"}
+    )
+
 @router.post("/upload")
 async def upload_pdf(file: UploadFile = File(...)):
     """Upload and analyze a PDF document"""
@@ -25,14 +44,94 @@ async def upload_pdf(file: UploadFile = File(...)):
         # Read file content
         content = await file.read()
         
-        # Process PDF
-        result = process_pdf_service(content, file.filename)
+        # Process PDF on the bounded worker pool so the event loop stays free
+        result = await get_pipeline_pool().run(process_pdf_service, content, file.filename)
         
         return result
         
+    except PoolSaturatedError as e:
+        raise _busy_error(e)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/jobs", status_code=202)
+async def create_pdf_job(file: UploadFile = File(...)):
+    """Queue a PDF for background analysis and return a job id immediately"""
+    try:
+        if not file.filename.endswith('.pdf'):
+            raise HTTPException(status_code=400, detail="Only PDF files are supported")
+
+        content = await file.read()
+        job = await run_in_threadpool(create_job, content, file.filename)
+
+        return {
+            "job_id": job.id,
+            "status": "queued",
+            "status_url": f"/pdf/jobs/{job.id}",
+            "events_url": f"/pdf/jobs/{job.id}/events",
+        }
+
+    except PoolSaturatedError as e:
+        raise _busy_error(e)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/jobs/{job_id}")
+async def get_pdf_job(job_id: str):
+    """Get job status, stage-level progress, partial results and the final result"""
+    try:
+        return await run_in_threadpool(lambda: get_job(job_id).snapshot())
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.get("/jobs/{job_id}/events")
+async def stream_pdf_job_events(job_id: str, request: Request):
+    """
+    Server-sent events with progress and partial results as each stage completes.
+    Only the latest "ocr" / "scoring" progress event is kept; a client resuming
+    from an older Last-Event-ID first gets a "snapshot" event with the job state.
+    """
+    try:
+        job = await run_in_threadpool(get_job, job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    # Resume support: EventSource sends the last id it saw on reconnect
+    try:
+        last_id = int(request.headers.get("last-event-id", 0))
+    except ValueError:
+        last_id = 0
+
+    async def event_stream():
+        nonlocal last_id
+        if last_id and await run_in_threadpool(job.missed_events, last_id):
+            # Progress events since last_id were replaced; send the current state first
+            snapshot = await run_in_threadpool(job.snapshot)
+            yield f"event: snapshot\ndata: {json.dumps(snapshot)}\n\n"
+        while True:
+            # Read the status first: the terminal event is stored with it, so a
+            # finished job has nothing left to send after this batch
+            finished = await run_in_threadpool(lambda: job.finished)
+            for event in await run_in_threadpool(job.events_since, last_id):
+                last_id = event["id"]
+                yield f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+            if finished:
+                break
+            if await request.is_disconnected():
+                break
+            await asyncio.sleep(JOB_EVENT_POLL_SECONDS)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/session/{session_id}")
 async def get_session(session_id: str):
     """Get session data"""
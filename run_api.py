@@ -33,7 +33,15 @@ def main():
     print()
     print("📋 Available Endpoints:")
     print("  POST /pdf/upload - Upload and analyze PDF")
-    print("  POST /chat/ - Chat with document")
+    print("  POST /pdf/jobs - Queue PDF analysis, returns a job id")
+    print("  GET  /pdf/jobs/{id} - Job progress and result")
+    print("  GET  /pdf/jobs/{id}/events - Job progress stream (SSE)")
+    print("  POST /chat/ - Chat with document (or corpus_id for a corpus)")
+    print("  POST /chat/stream - Streamed chat answer (SSE)")
+    print("  POST /corpus/{id}/documents - Add a document session to a corpus")
+    print("  DELETE /corpus/{id}/documents/{doc_id} - Remove a document from a corpus")
+    print("  GET  /corpus/{id} - Corpus stats and documents")
+    print("  POST /corpus/{id}/search - Search across a corpus")
     print("  GET  /pdf/session/{id} - Get session data")
     print("  GET  /pdf/download/highlighted/{id} - Download highlighted PDF")
     print("  GET  /pdf/download/keywords/{id} - Download keywords")
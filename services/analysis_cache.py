@@ -0,0 +1,202 @@
+import os
+import time
+import fcntl
+import sqlite3
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from modules.config import CACHE_DIR
+from modules.persistent_cache import PersistentCache
+from services.session_backend import SESSION_PERSIST_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever a pipeline change would alter results for the same PDF bytes
+PIPELINE_CONFIG_VERSION = "pipeline-v3"
+
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "100000"))
+# Digest mappings must not outlive (or expire before) the sessions they point to
+ANALYSIS_CACHE_TTL_SECONDS = SESSION_PERSIST_TTL_SECONDS
+
+# Links not used for this long are purged (matches the persisted session TTL)
+SESSION_LINK_TTL_SECONDS = ANALYSIS_CACHE_TTL_SECONDS
+_LINK_TOUCH_INTERVAL_SECONDS = 3600
+
+# Per-digest lock files that serialize identical analyses across worker processes
+ANALYSIS_LOCK_DIR = os.path.join(CACHE_DIR, "analysis")
+
+_ANALYSIS_INDEX: Optional[PersistentCache] = None
+
+_LINKS: Optional[sqlite3.Connection] = None
+_LINKS_LOCK = threading.Lock()
+
+# digest -> Future of the computation currently running for that content
+_INFLIGHT: Dict[str, Future] = {}
+_INFLIGHT_LOCK = threading.Lock()
+
+
+def content_digest(pdf_bytes: bytes) -> str:
+    """SHA-256 of the PDF bytes, namespaced by the pipeline config version."""
+    h = hashlib.sha256(PIPELINE_CONFIG_VERSION.encode("utf-8"))
+    h.update(b"\x00")
+    h.update(pdf_bytes)
+    return h.hexdigest()
+
+
+def get_analysis_index() -> PersistentCache:
+    """Persistent content digest -> session id map, shared by every worker."""
+    global _ANALYSIS_INDEX
+    if _ANALYSIS_INDEX is None:
+        _ANALYSIS_INDEX = PersistentCache(
+            "analysis_sessions",
+            max_entries=ANALYSIS_CACHE_MAX_ENTRIES,
+            ttl_seconds=ANALYSIS_CACHE_TTL_SECONDS
+        )
+    return _ANALYSIS_INDEX
+
+
+def lookup_session(digest: str) -> Optional[str]:
+    return get_analysis_index().get(digest)
+
+
+def remember_session(digest: str, session_id: str) -> None:
+    get_analysis_index().set(digest, session_id)
+
+
+def forget_session(digest: str) -> None:
+    get_analysis_index().delete(digest)
+
+
+# ---- upload session -> shared analysis session ----
+def _links() -> sqlite3.Connection:
+    """
+    Every upload gets its own session id, linked to the session that holds the
+    analysis of its content. Identical uploads link to the same analysis; it
+    is deleted with its last link. Shared by every worker (SQLite, WAL).
+    """
+    global _LINKS
+    if _LINKS is None:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        conn = sqlite3.connect(os.path.join(CACHE_DIR, "session_links.sqlite3"),
+                               check_same_thread=False, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS links ("
+            " session_id TEXT PRIMARY KEY,"
+            " shared_id TEXT NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_links_shared ON links(shared_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_links_accessed ON links(accessed_at)")
+        _LINKS = conn
+    return _LINKS
+
+
+def link_session(session_id: str, shared_id: str) -> None:
+    now = time.time()
+    with _LINKS_LOCK:
+        conn = _links()
+        conn.execute("INSERT OR REPLACE INTO links (session_id, shared_id, accessed_at) VALUES (?, ?, ?)",
+                     (session_id, shared_id, now))
+        conn.execute("DELETE FROM links WHERE accessed_at < ?", (now - SESSION_LINK_TTL_SECONDS,))
+
+
+def resolve_session(session_id: str) -> str:
+    """Id of the session holding the analysis for an upload session id (itself if not linked)."""
+    now = time.time()
+    with _LINKS_LOCK:
+        conn = _links()
+        row = conn.execute("SELECT shared_id, accessed_at FROM links WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None:
+            return session_id
+        shared_id, accessed_at = row
+        if now - accessed_at > _LINK_TOUCH_INTERVAL_SECONDS:
+            conn.execute("UPDATE links SET accessed_at = ? WHERE session_id = ?", (now, session_id))
+        return shared_id
+
+
+def unlink_session(session_id: str) -> Tuple[Optional[str], int]:
+    """
+    Remove an upload's link. Returns (shared session id, links left to it),
+    or (None, 0) if the session was not linked.
+    """
+    with _LINKS_LOCK:
+        conn = _links()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT shared_id FROM links WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None, 0
+            conn.execute("DELETE FROM links WHERE session_id = ?", (session_id,))
+            remaining = conn.execute("SELECT COUNT(*) FROM links WHERE shared_id = ?", (row[0],)).fetchone()[0]
+            conn.execute("COMMIT")
+            return row[0], remaining
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+
+@contextmanager
+def _digest_lock(digest: str):
+    """
+    Exclusive flock on ANALYSIS_LOCK_DIR/<digest>.lock, held across processes.
+    The holder removes the file on release; a waiter that then wins the lock
+    on the removed file retries on a fresh one.
+    """
+    os.makedirs(ANALYSIS_LOCK_DIR, exist_ok=True)
+    path = os.path.join(ANALYSIS_LOCK_DIR, f"{digest}.lock")
+    while True:
+        lock_file = open(path, "a")
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            if os.fstat(lock_file.fileno()).st_ino == os.stat(path).st_ino:
+                break
+        except FileNotFoundError:
+            pass
+        lock_file.close()
+
+    try:
+        yield
+    finally:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        lock_file.close()
+
+
+def coalesce(digest: str, compute: Callable[[], Any]) -> Tuple[Any, bool]:
+    """
+    Run `compute` once per digest at a time. Concurrent callers with the same
+    digest wait for the first caller's result instead of recomputing it:
+    within a process through a shared Future, across worker processes through
+    a per-digest file lock (so `compute` should first check whether another
+    process already stored the result). Returns (result, computed_here).
+    """
+    with _INFLIGHT_LOCK:
+        future = _INFLIGHT.get(digest)
+        leader = future is None
+        if leader:
+            future = Future()
+            _INFLIGHT[digest] = future
+
+    if not leader:
+        logger.info(f"Waiting for in-flight analysis of {digest[:12]}")
+        return future.result(), False
+
+    try:
+        with _digest_lock(digest):
+            result = compute()
+        future.set_result(result)
+        return result, True
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _INFLIGHT_LOCK:
+            _INFLIGHT.pop(digest, None)
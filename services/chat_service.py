@@ -1,17 +1,112 @@
-from modules.chatbot import answer_query_with_context
-from services.pdf_service import DOCUMENT_STORE
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
-def chat_with_document(session_id: str, query: str) -> str:
-    """Chat with a specific document session"""
-    if session_id not in DOCUMENT_STORE:
-        return "Session not found. Please upload a PDF first."
+from modules.chatbot import (
+    answer_query_with_sources,
+    answer_query_over_corpus,
+    retrieve_document_context,
+    retrieve_corpus_context,
+    stream_answer_from_context
+)
+from modules.answer_cache import get_answer_cache, document_key
+from modules.corpus_index import corpus_exists
+from modules.vector_store import embed_query, RETRIEVAL_MODE
+from services.pdf_service import get_document
+
+def _answer_cache_key(session_id: str, session_data: Dict[str, Any], retrieval: Optional[str]) -> str:
+    document = document_key(session_id, session_data.get("content_sha256"))
+    return f"{document}:{retrieval or RETRIEVAL_MODE}"
+
+def _cached_answer(cache_key: str, query_vec) -> Optional[Tuple[str, List[Dict[str, Any]], Dict[str, Any]]]:
+    cached = get_answer_cache().lookup(cache_key, query_vec[0])
+    if cached is None:
+        return None
+    payload, similarity = cached
+    retrieval = {**payload["retrieval"], "cache": "hit", "similarity": round(similarity, 4)}
+    return payload["answer"], payload["sources"], retrieval
+
+def _remember_answer(cache_key: str, query_vec, answer: str, sources: List[Dict[str, Any]],
+                     retrieval: Dict[str, Any]) -> None:
+    get_answer_cache().store(cache_key, query_vec[0], {"answer": answer, "sources": sources, "retrieval": retrieval})
+
+def chat_with_document(session_id: str, query: str,
+                       retrieval: Optional[str] = None) -> Tuple[str, List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Chat with a specific document session.
+    Returns (answer, sources with pages, retrieval mode and latencies).
+    Questions close enough to one already answered for this document are
+    served from the semantic answer cache without calling the LLM.
+    """
+    session_data = get_document(session_id)
+    if session_data is None:
+        return "Session not found. Please upload a PDF first.", [], {}
     
-    session_data = DOCUMENT_STORE[session_id]
     index = session_data["index"]
     chunks = session_data["chunks"]
     
     try:
-        answer = answer_query_with_context(query, index, chunks)
-        return answer
+        cache_key = _answer_cache_key(session_id, session_data, retrieval)
+        query_vec = embed_query(query)
+        cached = _cached_answer(cache_key, query_vec)
+        if cached is not None:
+            return cached
+
+        answer, sources, stats = answer_query_with_sources(query, index, chunks, session_data.get("chunk_meta"),
+                                                           bm25=session_data.get("bm25"), mode=retrieval,
+                                                           query_vec=query_vec)
+        _remember_answer(cache_key, query_vec, answer, sources, stats)
+        return answer, sources, {**stats, "cache": "miss"}
+    except ValueError:
+        raise
+    except Exception as e:
+        return f"Error processing query: {str(e)}", [], {}
+
+def chat_with_corpus(corpus_id: str, query: str) -> Tuple[str, List[Dict[str, Any]]]:
+    """Chat across every document in a corpus. Returns (answer, sources)."""
+    if not corpus_exists(corpus_id):
+        return "Corpus not found. Please add documents to it first.", []
+
+    try:
+        return answer_query_over_corpus(query, corpus_id)
     except Exception as e:
-        return f"Error processing query: {str(e)}"
+        return f"Error processing query: {str(e)}", []
+
+def prepare_chat_context(query: str, session_id: Optional[str] = None, corpus_id: Optional[str] = None,
+                         retrieval: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Run retrieval for a streamed answer. Returns a dict with "context",
+    "sources", "retrieval" stats, "cached_answer" (set on a semantic cache
+    hit, in which case no LLM call is needed) and "remember", a callback
+    that caches the final streamed answer (None when not cacheable).
+    Raises ValueError when the session or corpus does not exist.
+    """
+    if corpus_id:
+        if not corpus_exists(corpus_id):
+            raise ValueError("Corpus not found")
+        context, sources, stats = retrieve_corpus_context(query, corpus_id)
+        return {"context": context, "sources": sources, "retrieval": stats, "cached_answer": None, "remember": None}
+
+    session_data = get_document(session_id)
+    if session_data is None:
+        raise ValueError("Session not found")
+
+    cache_key = _answer_cache_key(session_id, session_data, retrieval)
+    query_vec = embed_query(query)
+    cached = _cached_answer(cache_key, query_vec)
+    if cached is not None:
+        answer, sources, stats = cached
+        return {"context": None, "sources": sources, "retrieval": stats, "cached_answer": answer, "remember": None}
+
+    context, sources, stats = retrieve_document_context(
+        query, session_data["index"], session_data["chunks"], session_data.get("chunk_meta"),
+        bm25=session_data.get("bm25"), mode=retrieval, query_vec=query_vec
+    )
+
+    def remember(answer: str) -> None:
+        _remember_answer(cache_key, query_vec, answer, sources, stats)
+
+    return {"context": context, "sources": sources, "retrieval": {**stats, "cache": "miss"},
+            "cached_answer": None, "remember": remember}
+
+def stream_chat_answer(query: str, context: str) -> Iterator[str]:
+    """Answer text pieces as the LLM produces them."""
+    return stream_answer_from_context(query, context)
@@ -0,0 +1,39 @@
+import logging
+from typing import Any, Dict, List
+
+from modules.corpus_index import corpus_exists
+from modules.vector_store import open_corpus, add_document_to_corpus, search_similar_chunks
+from services.pdf_service import get_document
+
+logger = logging.getLogger(__name__)
+
+
+def _get_corpus(corpus_id: str):
+    if not corpus_exists(corpus_id):
+        raise ValueError("Corpus not found")
+    return open_corpus(corpus_id)
+
+
+def add_session_to_corpus(corpus_id: str, session_id: str) -> Dict[str, Any]:
+    """Add an analyzed document (by session id) to a corpus, creating the corpus if needed."""
+    session = get_document(session_id)
+    if session is None:
+        raise ValueError("Session not found")
+
+    chunks = add_document_to_corpus(corpus_id, session_id, session["text"],
+                                    filename=session.get("filename"), page_starts=session.get("page_starts"))
+    return {"corpus_id": corpus_id, "doc_id": session_id, "chunks": chunks}
+
+
+def remove_document_from_corpus(corpus_id: str, doc_id: str) -> bool:
+    return _get_corpus(corpus_id).delete_document(doc_id)
+
+
+def get_corpus_info(corpus_id: str) -> Dict[str, Any]:
+    corpus = _get_corpus(corpus_id)
+    return {**corpus.stats(), "document_list": corpus.documents()}
+
+
+def search_corpus(corpus_id: str, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    _get_corpus(corpus_id)
+    return search_similar_chunks(query, top_k=top_k, corpus_id=corpus_id)
@@ -0,0 +1,234 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from modules.config import CACHE_DIR
+from services.pdf_service import process_pdf_service
+from services.worker_pool import get_pipeline_pool
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs are kept this long so clients can still poll the result;
+# unfinished jobs not updated for this long are dropped as abandoned
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join(CACHE_DIR, "jobs.sqlite3"))
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+# Progress events that replace the previous one of their kind instead of
+# accumulating (one per OCR page / scoring batch)
+PROGRESS_EVENTS = ("ocr", "scoring")
+
+_DB: Optional[sqlite3.Connection] = None
+_DB_LOCK = threading.Lock()
+
+
+def _db() -> sqlite3.Connection:
+    """
+    Job status, progress and events, shared by every worker process (SQLite,
+    WAL), so any worker can answer status and event requests for a job.
+    Caller holds _DB_LOCK.
+    """
+    global _DB
+    if _DB is None:
+        os.makedirs(os.path.dirname(JOB_DB_PATH) or ".", exist_ok=True)
+        conn = sqlite3.connect(JOB_DB_PATH, check_same_thread=False, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY,"
+            " filename TEXT,"
+            " status TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " progress TEXT NOT NULL,"
+            " partial TEXT NOT NULL,"
+            " result TEXT,"
+            " error TEXT,"
+            " last_event_id INTEGER NOT NULL DEFAULT 0)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            " job_id TEXT NOT NULL,"
+            " id INTEGER NOT NULL,"
+            " event TEXT NOT NULL,"
+            " data TEXT NOT NULL,"
+            " PRIMARY KEY (job_id, id))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_updated ON jobs(updated_at)")
+        _DB = conn
+    return _DB
+
+
+class Job:
+    """Handle on a background PDF analysis job in the shared job store."""
+
+    def __init__(self, job_id: str, filename: Optional[str] = None):
+        self.id = job_id
+        self.filename = filename
+
+    @classmethod
+    def create(cls, filename: str) -> "Job":
+        job = cls(str(uuid.uuid4()), filename)
+        now = time.time()
+        with _DB_LOCK:
+            _db().execute(
+                "INSERT INTO jobs (job_id, filename, status, created_at, updated_at, progress, partial) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, '{}')",
+                (job.id, filename, now, now, json.dumps({"stages": {}}))
+            )
+        return job
+
+    def _update(self, event: str, data: Dict[str, Any], **columns: Any) -> None:
+        """Apply an event to the job row and append it to the event log, atomically."""
+        with _DB_LOCK:
+            conn = _db()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT progress, partial, last_event_id FROM jobs WHERE job_id = ?",
+                                   (self.id,)).fetchone()
+                if row is None:
+                    conn.execute("ROLLBACK")
+                    return
+                progress, partial = json.loads(row[0]), json.loads(row[1])
+                event_id = row[2] + 1
+
+                if event in PROGRESS_EVENTS:
+                    progress[event] = data
+                    conn.execute("DELETE FROM events WHERE job_id = ? AND event = ?", (self.id, event))
+                elif event == "stage":
+                    stage = data["stage"]
+                    progress["stages"][stage] = {"seconds": data["seconds"], "error": data["error"]}
+                    if data.get("result") is not None:
+                        partial[stage] = data["result"]
+
+                assignments = "".join(f", {name} = ?" for name in columns)
+                conn.execute(
+                    f"UPDATE jobs SET updated_at = ?, progress = ?, partial = ?, last_event_id = ?{assignments} "
+                    "WHERE job_id = ?",
+                    (time.time(), json.dumps(progress), json.dumps(partial), event_id, *columns.values(), self.id)
+                )
+                conn.execute("INSERT INTO events (job_id, id, event, data) VALUES (?, ?, ?, ?)",
+                             (self.id, event_id, event, json.dumps(data)))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def publish(self, event: str, data: Dict[str, Any]) -> None:
+        """Record progress and append an event for stream listeners (thread-safe)."""
+        self._update(event, data)
+
+    def set_status(self, status: str, result: Optional[Dict[str, Any]] = None,
+                   error: Optional[str] = None) -> None:
+        payload: Dict[str, Any] = {"status": status}
+        if error:
+            payload["error"] = error
+        if result:
+            payload["session_id"] = result.get("session_id")
+        # Status and its event change in one transaction, so a stream that sees
+        # the job finished has already been handed the terminal event
+        self._update(status, payload, status=status,
+                     result=json.dumps(result) if result is not None else None, error=error)
+
+    def events_since(self, last_id: int) -> List[Dict[str, Any]]:
+        with _DB_LOCK:
+            rows = _db().execute("SELECT id, event, data FROM events WHERE job_id = ? AND id > ? ORDER BY id",
+                                 (self.id, last_id)).fetchall()
+        return [{"id": i, "event": event, "data": json.loads(data)} for i, event, data in rows]
+
+    def missed_events(self, last_id: int) -> bool:
+        """True if progress events after `last_id` were replaced by newer ones."""
+        with _DB_LOCK:
+            row = _db().execute(
+                "SELECT j.last_event_id, (SELECT COUNT(*) FROM events e WHERE e.job_id = j.job_id AND e.id > ?) "
+                "FROM jobs j WHERE j.job_id = ?",
+                (last_id, self.id)
+            ).fetchone()
+        return row is not None and row[1] < row[0] - last_id
+
+    @property
+    def status(self) -> str:
+        with _DB_LOCK:
+            row = _db().execute("SELECT status FROM jobs WHERE job_id = ?", (self.id,)).fetchone()
+        return row[0] if row else "failed"
+
+    @property
+    def finished(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    def snapshot(self) -> Dict[str, Any]:
+        with _DB_LOCK:
+            row = _db().execute(
+                "SELECT filename, status, created_at, updated_at, progress, partial, result, error "
+                "FROM jobs WHERE job_id = ?", (self.id,)
+            ).fetchone()
+        if row is None:
+            raise ValueError("Job not found")
+        filename, status, created_at, updated_at, progress, partial, result, error = row
+        return {
+            "job_id": self.id,
+            "filename": filename,
+            "status": status,
+            "created_at": created_at,
+            "updated_at": updated_at,
+            "progress": json.loads(progress),
+            "partial_results": json.loads(partial),
+            "result": json.loads(result) if result else None,
+            "error": error,
+        }
+
+
+def _purge_old_jobs() -> None:
+    cutoff = time.time() - JOB_RETENTION_SECONDS
+    with _DB_LOCK:
+        conn = _db()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM events WHERE job_id IN (SELECT job_id FROM jobs WHERE updated_at < ?)",
+                         (cutoff,))
+            conn.execute("DELETE FROM jobs WHERE updated_at < ?", (cutoff,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+
+def _run_job(job: Job, pdf_bytes: bytes) -> None:
+    job.set_status("running")
+    try:
+        result = process_pdf_service(pdf_bytes, job.filename, progress=job.publish)
+        job.set_status("completed", result=result)
+    except Exception as e:
+        logger.error(f"Job {job.id} failed: {e}")
+        job.set_status("failed", error=str(e))
+
+
+def create_job(pdf_bytes: bytes, filename: str) -> Job:
+    """
+    Queue a PDF for background analysis and return immediately.
+    Raises PoolSaturatedError when the worker pool cannot accept more work.
+    """
+    _purge_old_jobs()
+
+    job = Job.create(filename)
+    try:
+        get_pipeline_pool().submit(_run_job, job, pdf_bytes)
+    except Exception:
+        with _DB_LOCK:
+            _db().execute("DELETE FROM jobs WHERE job_id = ?", (job.id,))
+        raise
+    return job
+
+
+def get_job(job_id: str) -> Job:
+    with _DB_LOCK:
+        row = _db().execute("SELECT filename FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    if row is None:
+        raise ValueError("Job not found")
+    return Job(job_id, row[0])
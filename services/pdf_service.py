@@ -1,18 +1,29 @@
 import os
+import time
 import uuid
 import tempfile
-from typing import Dict, Any
+from typing import Any, Callable, Dict, Optional
 
 import numpy as np
 
-from modules.pdf_processor import extract_text_from_pdf, split_into_paragraphs
-from modules.keyword import load_legalbert_model, extract_legal_keywords
+from modules.pdf_processor import extract_pages_with_layout, join_pages, split_into_paragraphs
+from modules.keyword import extract_legal_keywords
+from modules.model_registry import get_keyword_model, get_sentence_model
 from modules.keyword_meaning import get_keywords_meaning_smart
-from modules.vector_store import create_faiss_index
+from modules.vector_store import build_document_index, build_bm25_index
+from modules.bm25 import BM25Index
 from modules.highlight_pdf import highlight_paragraphs_in_original_pdf
+from modules.answer_cache import get_answer_cache, document_key
 from modules.case_law_fetcher import get_cases_for_keywords
 from modules.semantic_importance import analyze_paragraphs_hybrid
 from modules.utils.text_cleaner import normalize_keyword   # ✅ IMPORTANT
+from services.pipeline import Stage, run_pipeline
+from services.session_store import SessionStore, SESSION_STORE_MAX_MB, SESSION_IDLE_TTL_SECONDS
+from services.session_backend import create_session_backend, register_binary_field
+from services import analysis_cache
+
+# Threads used to run independent pipeline stages concurrently
+PIPELINE_STAGE_WORKERS = int(os.getenv("PIPELINE_STAGE_WORKERS", "4"))
 
 
 # -------------------------------
@@ -36,22 +47,214 @@ def to_python(obj):
 kw_model = None
 
 def initialize_models():
-    """Load heavy models once at startup"""
+    """Load heavy models once at startup (shared via the model registry)"""
     global kw_model
     if kw_model is None:
-        kw_model = load_legalbert_model()
+        kw_model = get_keyword_model()
+    get_sentence_model()
 
 
 # -------------------------------
 # GLOBAL DOCUMENT STORE
 # -------------------------------
-DOCUMENT_STORE: Dict[str, Dict[str, Any]] = {}
+# Bounded by SESSION_STORE_MAX_MB with idle TTL + LRU eviction. With a persistent
+# backend (SESSION_BACKEND) any worker can serve any session, across restarts.
+DOCUMENT_STORE = SessionStore(
+    max_bytes=SESSION_STORE_MAX_MB * 1024 * 1024,
+    idle_ttl_seconds=SESSION_IDLE_TTL_SECONDS,
+    backend=create_session_backend()
+)
+
+# Session fields that are in-memory objects rather than JSON data
+INTERNAL_SESSION_KEYS = ("index", "bm25")
+
+register_binary_field("bm25", "bm25.npz", lambda bm25, path: bm25.save(path), BM25Index.load)
+
+
+# -------------------------------
+# PIPELINE STAGES
+# -------------------------------
+def _keywords_stage(results: Dict[str, Any]):
+    raw_keywords = extract_legal_keywords(results["text"], kw_model, top_n=15)
+
+    cleaned_keywords = []
+    for kw in raw_keywords:
+        clean = normalize_keyword(kw)
+        if clean and clean not in cleaned_keywords:
+            cleaned_keywords.append(clean)
+
+    return cleaned_keywords
+
+
+def _meanings_stage(results: Dict[str, Any]):
+    return get_keywords_meaning_smart(results["keywords"])
+
+
+def _case_laws_stage(results: Dict[str, Any]):
+    # ONLY CLEAN KEYWORDS
+    if not results["keywords"]:
+        return {}
+    laws = get_cases_for_keywords(results["keywords"][:5])
+    return {k: v[0] for k, v in laws.items()}   # remove UI text
+
+
+def _index_stage(results: Dict[str, Any]):
+    return build_document_index(results["text"], results["page_starts"])
+
+
+def _bm25_stage(results: Dict[str, Any]):
+    _, chunks, _ = results["index"]
+    return build_bm25_index([c["text"] for c in chunks])
+
+
+def _importance_metrics(paragraph_data):
+    return {
+        "high_priority": sum(1 for p in paragraph_data if p.get("importance") == "high"),
+        "medium_priority": sum(1 for p in paragraph_data if p.get("importance") == "medium"),
+        "low_priority": sum(1 for p in paragraph_data if p.get("importance") == "low"),
+        "total_paragraphs": len(paragraph_data),
+    }
+
+
+def _partial_result(stage: str, value: Any) -> Any:
+    """Client-facing slice of a finished stage, pushed to job listeners."""
+    if stage in ("keywords", "meanings", "case_laws"):
+        return value
+    if stage == "paragraph_data":
+        return {"metrics": _importance_metrics(value or [])}
+    if stage == "index":
+        return {"chunks": len(value[1]) if value else 0}
+    if stage == "bm25":
+        return value.stats() if value else None
+    if stage == "highlight":
+        return {"highlighted_pdf_ready": bool(value)}
+    return None
+
+
+def _build_stages(pdf_path: str, progress: Optional[Callable] = None):
+    def paragraphs_stage(results: Dict[str, Any]):
+        paragraphs = split_into_paragraphs(results["text"])
+        return analyze_paragraphs_hybrid(paragraphs, progress=progress)
+
+    def highlight_stage(results: Dict[str, Any]):
+        # Per-upload output path: concurrent uploads must not share one file
+        output_path = os.path.splitext(pdf_path)[0] + "_highlighted.pdf"
+        return highlight_paragraphs_in_original_pdf(
+            pdf_path, results["paragraph_data"], output_path=output_path,
+            ocr_layouts=results.get("ocr_layouts")
+        )
+
+    return [
+        Stage("keywords", _keywords_stage, default=[]),
+        Stage("meanings", _meanings_stage, deps=["keywords"], default={}),
+        Stage("case_laws", _case_laws_stage, deps=["keywords"], default={}),
+        Stage("paragraph_data", paragraphs_stage, default=[]),
+        Stage("index", _index_stage, required=True),   # chat cannot work without it
+        Stage("bm25", _bm25_stage, deps=["index"], default=None),
+        Stage("highlight", highlight_stage, deps=["paragraph_data"], default=None),
+    ]
 
 
 # -------------------------------
 # MAIN PDF PROCESSING SERVICE
 # -------------------------------
-def process_pdf_service(pdf_bytes: bytes, filename: str) -> Dict[str, Any]:
+def process_pdf_service(pdf_bytes: bytes, filename: str,
+                        progress: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    Analyze an uploaded PDF, reusing prior analysis of identical content.
+
+    Uploads are content-addressed by SHA-256 of the bytes plus the pipeline
+    config version: a repeat upload reuses the stored analysis (result, index
+    and highlighted PDF) without rerunning the pipeline, and concurrent
+    identical uploads share a single computation. Every upload still gets its
+    own session id, linked to the shared analysis, so deleting one upload's
+    session does not affect the others.
+    """
+    digest = analysis_cache.content_digest(pdf_bytes)
+
+    cached = _cached_response(digest)
+    if cached is not None:
+        if progress:
+            progress("cached", {"session_id": cached["session_id"]})
+        return cached
+
+    def compute():
+        # Another request may have finished the same content while we waited
+        shared_id = analysis_cache.lookup_session(digest)
+        if shared_id and DOCUMENT_STORE.get(shared_id) is not None:
+            return shared_id, False
+        shared_id = _analyze_pdf(pdf_bytes, filename, digest, progress)
+        analysis_cache.remember_session(digest, shared_id)
+        return shared_id, True
+
+    (shared_id, analyzed), computed_here = analysis_cache.coalesce(digest, compute)
+    response = _link_upload(shared_id, cached=not (computed_here and analyzed))
+    if response is None:
+        raise Exception("Error processing PDF: analysis was deleted before it could be linked")
+    return response
+
+
+def _link_upload(shared_id: str, cached: bool) -> Optional[Dict[str, Any]]:
+    """New upload session id pointing at the stored analysis `shared_id`; None if it is gone."""
+    session_id = str(uuid.uuid4())
+    analysis_cache.link_session(session_id, shared_id)
+
+    # Linked before reading, so deleting the last other upload cannot remove it under us
+    data = DOCUMENT_STORE.get(shared_id)
+    if data is None:
+        analysis_cache.unlink_session(session_id)
+        return None
+    return _build_response(session_id, data, cached=cached)
+
+
+def _cached_response(digest: str) -> Optional[Dict[str, Any]]:
+    shared_id = analysis_cache.lookup_session(digest)
+    if not shared_id:
+        return None
+
+    response = _link_upload(shared_id, cached=True)
+    if response is None:
+        # Analysis was deleted or expired: drop the stale mapping and recompute
+        analysis_cache.forget_session(digest)
+    return response
+
+
+def _build_response(session_id: str, data: Dict[str, Any], cached: bool = False) -> Dict[str, Any]:
+    return to_python({
+        "session_id": session_id,
+        "message": "Document processed successfully",
+        "keywords": data["keywords"],
+        "keyword_meanings": data["meanings"],
+        "case_laws": data["case_laws"],
+        "paragraph_data": data["paragraph_data"],
+        "metrics": data["metrics"],
+        "timings": data.get("timings", {}),
+        "stage_errors": data.get("stage_errors", {}),
+        "cached": cached,
+    })
+
+
+def _analyze_pdf(pdf_bytes: bytes, filename: str, digest: str,
+                 progress: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    Run the full analysis pipeline for an uploaded PDF and store the session.
+    Returns the id it is stored under; uploads link to it with _link_upload.
+
+    `progress(event, data)`, if given, receives "ocr" and "scoring" progress
+    updates and a "stage" event with a partial result as each stage completes.
+    """
+    def report(event: str, data: Dict[str, Any]):
+        if progress:
+            progress(event, to_python(data))
+
+    def on_stage_done(stage: str, value: Any, seconds: float, error: Optional[str]):
+        report("stage", {
+            "stage": stage,
+            "seconds": seconds,
+            "error": error,
+            "result": _partial_result(stage, value),
+        })
+
     try:
         initialize_models()
 
@@ -75,95 +278,67 @@ def process_pdf_service(pdf_bytes: bytes, filename: str) -> Dict[str, Any]:
         mock_file = MockUploadedFile(pdf_path, filename)
 
         # -------- PIPELINE --------
-        text = extract_text_from_pdf(mock_file)
+        extract_start = time.perf_counter()
+        pages, ocr_layouts = extract_pages_with_layout(mock_file, progress=report)
+        text, page_starts = join_pages(pages)
+        extract_seconds = time.perf_counter() - extract_start
 
         if not text or not text.strip():
             raise ValueError("No extractable text found in PDF")
 
-        # -------------------------------
-        # KEYWORDS + CLEANING
-        # -------------------------------
-        raw_keywords = extract_legal_keywords(text, kw_model, top_n=15)
-
-        cleaned_keywords = []
-        for kw in raw_keywords:
-            clean = normalize_keyword(kw)
-            if clean and clean not in cleaned_keywords:
-                cleaned_keywords.append(clean)
-
-        # -------------------------------
-        # MEANINGS
-        # -------------------------------
-        meanings = get_keywords_meaning_smart(cleaned_keywords)
-
-        # -------------------------------
-        # CASE LAWS (ONLY CLEAN KEYWORDS)
-        # -------------------------------
-        case_laws = {}
-        if cleaned_keywords:
-            laws = get_cases_for_keywords(cleaned_keywords[:5])
-            case_laws = {k: v[0] for k, v in laws.items()}   # remove UI text
-
-        # -------------------------------
-        # PARAGRAPH & IMPORTANCE
-        # -------------------------------
-        paragraphs = split_into_paragraphs(text)
-        paragraph_data = analyze_paragraphs_hybrid(paragraphs)
-
-        index, chunks = create_faiss_index(text)
-
-        # Highlighting (fail-safe)
-        try:
-            highlighted_pdf_path = highlight_paragraphs_in_original_pdf(
-                pdf_path, paragraph_data
-            )
-        except Exception:
-            highlighted_pdf_path = None
+        on_stage_done("extract_text", None, round(extract_seconds, 3), None)
+
+        # Every stage below only needs the extracted text (or an earlier stage),
+        # so network-bound LLM stages overlap with the CPU-bound embedding stages.
+        results, timings, stage_errors = run_pipeline(
+            _build_stages(pdf_path, progress=report),
+            initial={"text": text, "page_starts": page_starts, "ocr_layouts": ocr_layouts},
+            max_workers=PIPELINE_STAGE_WORKERS,
+            on_stage_done=on_stage_done
+        )
+        timings = {"extract_text": round(extract_seconds, 3), **timings}
+
+        cleaned_keywords = results["keywords"]
+        meanings = results["meanings"]
+        case_laws = results["case_laws"]
+        paragraph_data = results["paragraph_data"]
+        index, chunks, index_config = results["index"]
+        chunk_meta = [{k: c[k] for k in ("start", "end", "page", "page_end")} for c in chunks]
+        highlighted_pdf_path = results["highlight"]
 
         # -------------------------------
         # METRICS
         # -------------------------------
-        high_count = sum(1 for p in paragraph_data if p.get("importance") == "high")
-        medium_count = sum(1 for p in paragraph_data if p.get("importance") == "medium")
-        low_count = sum(1 for p in paragraph_data if p.get("importance") == "low")
-
         metrics = {
-            "high_priority": high_count,
-            "medium_priority": medium_count,
-            "low_priority": low_count,
-            "total_paragraphs": len(paragraph_data),
+            **_importance_metrics(paragraph_data),
             "total_keywords": len(cleaned_keywords),
         }
 
         # -------------------------------
         # STORE SESSION
         # -------------------------------
-        DOCUMENT_STORE[session_id] = {
+        record = {
             "text": text,
             "keywords": cleaned_keywords,
             "meanings": meanings,
             "case_laws": case_laws,
             "paragraph_data": paragraph_data,
             "index": index,
-            "chunks": chunks,
+            "index_config": index_config,
+            "bm25": results["bm25"],
+            "chunks": [c["text"] for c in chunks],
+            "chunk_meta": chunk_meta,
+            "page_starts": page_starts,
             "original_pdf_path": pdf_path,
             "highlighted_pdf_path": highlighted_pdf_path,
             "filename": filename,
             "metrics": metrics,
+            "timings": timings,
+            "stage_errors": stage_errors,
+            "content_sha256": digest,
         }
-
-        # -------------------------------
-        # FINAL RESPONSE
-        # -------------------------------
-        return to_python({
-            "session_id": session_id,
-            "message": "Document processed successfully",
-            "keywords": cleaned_keywords,
-            "keyword_meanings": meanings,
-            "case_laws": case_laws,
-            "paragraph_data": paragraph_data,
-            "metrics": metrics,
-        })
+        DOCUMENT_STORE[session_id] = record
+        return session_id
 
     except Exception as e:
         try:
@@ -177,44 +352,51 @@ def process_pdf_service(pdf_bytes: bytes, filename: str) -> Dict[str, Any]:
 # -------------------------------
 # SESSION HELPERS
 # -------------------------------
-def get_session_data(session_id: str) -> Dict[str, Any]:
-    if session_id not in DOCUMENT_STORE:
+def get_document(session_id: str) -> Optional[Dict[str, Any]]:
+    """Analysis record behind an upload session id, or None."""
+    return DOCUMENT_STORE.get(analysis_cache.resolve_session(session_id))
+
+
+def _get_session(session_id: str) -> Dict[str, Any]:
+    data = get_document(session_id)
+    if data is None:
         raise ValueError("Session not found")
+    return data
+
+
+def get_session_data(session_id: str) -> Dict[str, Any]:
+    data = _get_session(session_id)
 
     return to_python({
         "session_id": session_id,
-        **DOCUMENT_STORE[session_id]
+        **{k: v for k, v in data.items() if k not in INTERNAL_SESSION_KEYS}
     })
 
 
 def delete_session(session_id: str) -> bool:
-    if session_id not in DOCUMENT_STORE:
-        return False
-
-    data = DOCUMENT_STORE[session_id]
-
-    for path in ["original_pdf_path", "highlighted_pdf_path"]:
-        try:
-            if data.get(path):
-                os.unlink(data[path])
-        except:
-            pass
-
-    del DOCUMENT_STORE[session_id]
-    return True
+    shared_id, remaining = analysis_cache.unlink_session(session_id)
+    if shared_id is None:
+        shared_id = session_id   # stored before uploads were linked
+    elif remaining:
+        return True              # other uploads still use the analysis
+
+    data = DOCUMENT_STORE.get(shared_id)
+    # The store removes the session's temp PDFs as well
+    deleted = DOCUMENT_STORE.delete(shared_id) or shared_id != session_id
+    if data is not None:
+        digest = data.get("content_sha256")
+        if digest and analysis_cache.lookup_session(digest) == shared_id:
+            analysis_cache.forget_session(digest)
+        get_answer_cache().invalidate(document_key(shared_id, digest))
+    return deleted
 
 
 def get_highlighted_pdf_path(session_id: str) -> str:
-    if session_id not in DOCUMENT_STORE:
-        raise ValueError("Session not found")
-    return DOCUMENT_STORE[session_id]["highlighted_pdf_path"]
+    return _get_session(session_id)["highlighted_pdf_path"]
 
 
 def get_keywords_text(session_id: str) -> str:
-    if session_id not in DOCUMENT_STORE:
-        raise ValueError("Session not found")
-
-    data = DOCUMENT_STORE[session_id]
+    data = _get_session(session_id)
     return "\n\n".join(
         f"{kw}: {data['meanings'].get(kw, 'No meaning available')}"
         for kw in data["keywords"]
@@ -222,6 +404,8 @@ def get_keywords_text(session_id: str) -> str:
 
 
 def get_raw_text(session_id: str) -> str:
-    if session_id not in DOCUMENT_STORE:
-        raise ValueError("Session not found")
-    return DOCUMENT_STORE[session_id]["text"]
+    return _get_session(session_id)["text"]
+
+
+def session_store_stats() -> Dict[str, Any]:
+    return DOCUMENT_STORE.stats()
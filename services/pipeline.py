@@ -0,0 +1,105 @@
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Stage:
+    """
+    One node of the processing DAG.
+
+    `func` receives the results of all finished stages (keyed by stage name) and
+    returns this stage's result. If it raises, the stage degrades to `default`
+    and dependents still run, unless `required` is set, in which case the whole
+    pipeline fails.
+    """
+
+    def __init__(self, name: str, func: Callable[[Dict[str, Any]], Any],
+                 deps: Iterable[str] = (), default: Any = None, required: bool = False):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.default = default
+        self.required = required
+
+
+class PipelineError(Exception):
+    """Raised when a required stage fails."""
+
+    def __init__(self, stage: str, error: Exception):
+        super().__init__(f"Stage '{stage}' failed: {error}")
+        self.stage = stage
+        self.error = error
+
+
+def run_pipeline(
+    stages: List[Stage],
+    initial: Optional[Dict[str, Any]] = None,
+    max_workers: int = 4,
+    on_stage_done: Optional[Callable[[str, Any, float, Optional[str]], None]] = None
+) -> Tuple[Dict[str, Any], Dict[str, float], Dict[str, str]]:
+    """
+    Run stages as soon as their dependencies have finished, in parallel threads.
+    `on_stage_done(name, result, seconds, error)` is called as each stage finishes.
+
+    Returns (results, timings, errors):
+    - results: stage name -> result (or default when the stage failed)
+    - timings: stage name -> wall-clock seconds
+    - errors: stage name -> error message for stages that degraded
+    """
+    results: Dict[str, Any] = dict(initial or {})
+    timings: Dict[str, float] = {}
+    errors: Dict[str, str] = {}
+
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        missing = [d for d in stage.deps if d not in by_name and d not in results]
+        if missing:
+            raise ValueError(f"Stage '{stage.name}' depends on unknown stages: {missing}")
+
+    pending = dict(by_name)
+    running = {}
+
+    def timed(stage: Stage):
+        start = time.perf_counter()
+        try:
+            return stage.func(results), None, time.perf_counter() - start
+        except Exception as e:
+            return None, e, time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            ready = [s for s in pending.values() if all(d in results for d in s.deps)]
+            for stage in ready:
+                del pending[stage.name]
+                running[executor.submit(timed, stage)] = stage
+
+            if not running:
+                raise ValueError(f"Dependency cycle between stages: {list(pending)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                value, error, seconds = future.result()
+                timings[stage.name] = round(seconds, 3)
+
+                if error is not None:
+                    if stage.required:
+                        for f in running:
+                            f.cancel()
+                        raise PipelineError(stage.name, error)
+                    logger.error(f"Stage '{stage.name}' failed, using default: {error}")
+                    errors[stage.name] = str(error)
+                    value = stage.default
+
+                results[stage.name] = value
+
+                if on_stage_done:
+                    try:
+                        on_stage_done(stage.name, value, timings[stage.name], errors.get(stage.name))
+                    except Exception as e:
+                        logger.error(f"Stage callback for '{stage.name}' failed: {e}")
+
+    return results, timings, errors
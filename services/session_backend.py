@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import shutil
+import logging
+import tempfile
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import faiss
+
+from modules.config import CACHE_DIR
+from modules.index_factory import configure_search
+from services.json_utils import to_python
+
+logger = logging.getLogger(__name__)
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "filesystem")  # "filesystem" or "memory"
+SESSION_DIR = os.getenv("SESSION_DIR", os.path.join(CACHE_DIR, "sessions"))
+SESSION_PERSIST_TTL_SECONDS = int(os.getenv("SESSION_PERSIST_TTL_SECONDS", str(7 * 86400)))
+
+# Session fields that point at files; they are moved into the session directory
+FILE_FIELDS = {
+    "original_pdf_path": "original.pdf",
+    "highlighted_pdf_path": "highlighted.pdf",
+}
+
+
+def _save_faiss(index, path: str) -> None:
+    faiss.write_index(index, path)
+
+
+def _load_faiss(path: str):
+    """Memory-map the index when this FAISS build supports it for the index type."""
+    for flag_name in ("IO_FLAG_MMAP_IFC", "IO_FLAG_MMAP"):
+        flag = getattr(faiss, flag_name, None)
+        if flag is None:
+            continue
+        try:
+            return faiss.read_index(path, flag)
+        except Exception:
+            continue
+    return faiss.read_index(path)
+
+
+# Non-JSON session fields: field -> (file name, save(obj, path), load(path))
+BINARY_FIELDS: Dict[str, Tuple[str, Callable[[Any, str], None], Callable[[str], Any]]] = {
+    "index": ("index.faiss", _save_faiss, _load_faiss),
+}
+
+
+def register_binary_field(field: str, filename: str,
+                          save: Callable[[Any, str], None], load: Callable[[str], Any]) -> None:
+    """Teach the backends how to persist an additional non-JSON session field."""
+    BINARY_FIELDS[field] = (filename, save, load)
+
+
+class SessionBackend:
+    """Persistent storage behind SessionStore, shared by every worker process."""
+
+    def save(self, session_id: str, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Persist a session. Returns the record with file paths pointing at the stored copies."""
+        raise NotImplementedError
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> bool:
+        raise NotImplementedError
+
+    def exists(self, session_id: str) -> bool:
+        raise NotImplementedError
+
+    def purge_expired(self) -> int:
+        return 0
+
+
+class FilesystemSessionBackend(SessionBackend):
+    """
+    One directory per session under `root`:
+        state.json        JSON fields (text, chunks, analysis results, ...)
+        index.faiss       FAISS index (memory-mapped back in on load; its query-time
+                          settings are reapplied from the "index_config" field)
+        original.pdf      uploaded PDF
+        highlighted.pdf   highlighted PDF
+    Sessions are written to a temp directory and renamed into place, so readers
+    in other workers never see a half-written session.
+    """
+
+    def __init__(self, root: str, ttl_seconds: Optional[float] = None):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(root, exist_ok=True)
+
+    def _session_dir(self, session_id: str) -> str:
+        # Session ids are server-generated, but never let one escape the root
+        if not session_id or os.path.basename(session_id) != session_id or session_id.startswith("."):
+            raise ValueError(f"Invalid session id: {session_id!r}")
+        return os.path.join(self.root, session_id)
+
+    def save(self, session_id: str, record: Dict[str, Any]) -> Dict[str, Any]:
+        final_dir = self._session_dir(session_id)
+        tmp_dir = tempfile.mkdtemp(prefix=f".{session_id}-", dir=self.root)
+
+        try:
+            stored = dict(record)
+            state = {}
+
+            for field, value in record.items():
+                if field in BINARY_FIELDS:
+                    if value is not None:
+                        filename, save, _ = BINARY_FIELDS[field]
+                        save(value, os.path.join(tmp_dir, filename))
+                elif field in FILE_FIELDS:
+                    if value and os.path.exists(value):
+                        shutil.move(value, os.path.join(tmp_dir, FILE_FIELDS[field]))
+                        stored[field] = os.path.join(final_dir, FILE_FIELDS[field])
+                    else:
+                        stored[field] = None
+                else:
+                    state[field] = value
+
+            with open(os.path.join(tmp_dir, "state.json"), "w", encoding="utf-8") as f:
+                json.dump(to_python(state), f)
+
+            if os.path.exists(final_dir):
+                shutil.rmtree(final_dir, ignore_errors=True)
+            os.replace(tmp_dir, final_dir)
+            return stored
+
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        session_dir = self._session_dir(session_id)
+        state_path = os.path.join(session_dir, "state.json")
+        if not os.path.exists(state_path):
+            return None
+
+        with open(state_path, encoding="utf-8") as f:
+            record = json.load(f)
+
+        for field, (filename, _, load) in BINARY_FIELDS.items():
+            path = os.path.join(session_dir, filename)
+            if os.path.exists(path):
+                record[field] = load(path)
+
+        # efSearch / nprobe are not part of the index file
+        if record.get("index") is not None and record.get("index_config"):
+            configure_search(record["index"], record["index_config"])
+
+        for field, filename in FILE_FIELDS.items():
+            path = os.path.join(session_dir, filename)
+            record[field] = path if os.path.exists(path) else None
+
+        # Mark as recently used so purge_expired keeps active sessions
+        os.utime(state_path, None)
+        return record
+
+    def delete(self, session_id: str) -> bool:
+        session_dir = self._session_dir(session_id)
+        if not os.path.isdir(session_dir):
+            return False
+        shutil.rmtree(session_dir, ignore_errors=True)
+        return True
+
+    def exists(self, session_id: str) -> bool:
+        try:
+            return os.path.exists(os.path.join(self._session_dir(session_id), "state.json"))
+        except ValueError:
+            return False
+
+    def purge_expired(self) -> int:
+        """Remove sessions whose state was not read or written within ttl_seconds."""
+        if self.ttl_seconds is None:
+            return 0
+
+        cutoff = time.time() - self.ttl_seconds
+        removed = 0
+        for name in os.listdir(self.root):
+            state_path = os.path.join(self.root, name, "state.json")
+            try:
+                expired = os.path.getmtime(state_path) < cutoff
+            except OSError:
+                # Leftover temp dir from a crashed save
+                expired = name.startswith(".") and os.path.getmtime(os.path.join(self.root, name)) < cutoff
+            if expired:
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+                removed += 1
+
+        if removed:
+            logger.info(f"Purged {removed} expired persisted sessions")
+        return removed
+
+
+def create_session_backend() -> Optional[SessionBackend]:
+    """Backend selected by SESSION_BACKEND; None keeps sessions in memory only."""
+    if SESSION_BACKEND == "memory":
+        return None
+    if SESSION_BACKEND == "filesystem":
+        return FilesystemSessionBackend(SESSION_DIR, ttl_seconds=SESSION_PERSIST_TTL_SECONDS)
+    raise ValueError(f"Unknown SESSION_BACKEND '{SESSION_BACKEND}'")
@@ -0,0 +1,304 @@
+import os
+import sys
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, Optional
+
+import faiss
+import numpy as np
+
+from services.session_backend import SessionBackend
+
+logger = logging.getLogger(__name__)
+
+SESSION_STORE_MAX_MB = int(os.getenv("SESSION_STORE_MAX_MB", "1024"))
+SESSION_IDLE_TTL_SECONDS = int(os.getenv("SESSION_IDLE_TTL_SECONDS", "7200"))
+
+# How often put() asks the backend to purge expired persisted sessions
+BACKEND_PURGE_INTERVAL_SECONDS = 600
+
+# Session fields that point at temp files owned by the session
+FILE_KEYS = ("original_pdf_path", "highlighted_pdf_path")
+
+
+def estimate_bytes(obj: Any, _seen: Optional[set] = None) -> int:
+    """
+    Approximate memory held by a session value.
+    FAISS indexes are counted by their serialized size (graph links, PQ codes
+    and refine vectors included), NumPy arrays by nbytes and containers
+    recursively; shared objects are only counted once.
+    """
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(
+            estimate_bytes(k, _seen) + estimate_bytes(v, _seen) for k, v in obj.items()
+        )
+    if isinstance(obj, (list, tuple, set)):
+        return sys.getsizeof(obj) + sum(estimate_bytes(v, _seen) for v in obj)
+
+    if isinstance(obj, faiss.Index):
+        return _faiss_index_bytes(obj)
+
+    if callable(getattr(obj, "memory_bytes", None)):
+        return obj.memory_bytes()
+
+    return sys.getsizeof(obj)
+
+
+def _faiss_index_bytes(index) -> int:
+    """
+    Serialized size of a FAISS index, close to its in-memory size for every
+    index type. Called once per session insert; the store keeps the result.
+    """
+    try:
+        return int(faiss.serialize_index(index).nbytes)
+    except Exception:
+        # Index types that cannot be serialized: count flat float32 storage
+        return int(index.ntotal) * int(index.d) * 4
+
+
+def _remove_session_files(record: Dict[str, Any]) -> None:
+    for key in FILE_KEYS:
+        path = record.get(key)
+        if not path:
+            continue
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove session file {path}: {e}")
+
+
+class SessionStore:
+    """
+    In-memory session store with a byte budget, idle TTL and LRU eviction.
+
+    Supports the dict operations the services use (`in`, `[]`, `del`, `get`).
+    Reading a session refreshes its position; evicted sessions have their temp
+    files removed.
+
+    With a `backend`, every session is also persisted. Memory then acts as a
+    cache: eviction only drops the in-memory copy, and a session missing from
+    memory (evicted, restarted, or created by another worker) is loaded back
+    from the backend on demand.
+    """
+
+    def __init__(self, max_bytes: int, idle_ttl_seconds: Optional[float],
+                 backend: Optional[SessionBackend] = None):
+        self.max_bytes = max_bytes
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.backend = backend
+        self._last_purge = 0.0
+        self._memory_only: set = set()  # sessions the backend failed to persist
+
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._last_access: Dict[str, float] = {}
+        self._total_bytes = 0
+        self._lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = {"lru": 0, "ttl": 0}
+        self.backend_loads = 0
+        self.backend_errors = 0
+
+    # ---- eviction ----
+    def _drop(self, session_id: str) -> Dict[str, Any]:
+        record = self._sessions.pop(session_id)
+        self._total_bytes -= self._sizes.pop(session_id)
+        self._last_access.pop(session_id, None)
+        return record
+
+    def _owns_files(self, session_id: str) -> bool:
+        # Files of persisted sessions belong to the backend
+        return self.backend is None or session_id in self._memory_only
+
+    def _evict(self, session_id: str, reason: str) -> None:
+        record = self._drop(session_id)
+        self.evictions[reason] += 1
+        if self._owns_files(session_id):
+            _remove_session_files(record)
+            self._memory_only.discard(session_id)
+        logger.info(f"Evicted session {session_id} ({reason})")
+
+    def _insert(self, session_id: str, record: Dict[str, Any], now: float) -> None:
+        size = estimate_bytes(record)
+        if session_id in self._sessions:
+            self._drop(session_id)
+
+        self._sessions[session_id] = record
+        self._sizes[session_id] = size
+        self._last_access[session_id] = now
+        self._total_bytes += size
+
+        self._expire_idle(now)
+        self._enforce_budget(keep=session_id)
+
+    def _deleted_elsewhere(self, session_id: str) -> bool:
+        if self.backend is None or session_id in self._memory_only:
+            return False
+        try:
+            return not self.backend.exists(session_id)
+        except Exception:
+            return False
+
+    def _load_from_backend(self, session_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            return self.backend.load(session_id)
+        except Exception as e:
+            self.backend_errors += 1
+            logger.error(f"Failed to load session {session_id} from backend: {e}")
+            return None
+
+    def _expire_idle(self, now: float) -> None:
+        if self.idle_ttl_seconds is None:
+            return
+        # Sessions are kept in access order, so expired ones sit at the front
+        while self._sessions:
+            oldest = next(iter(self._sessions))
+            if now - self._last_access[oldest] <= self.idle_ttl_seconds:
+                break
+            self._evict(oldest, "ttl")
+
+    def _enforce_budget(self, keep: str) -> None:
+        while self._total_bytes > self.max_bytes and len(self._sessions) > 1:
+            oldest = next(iter(self._sessions))
+            if oldest == keep:
+                break
+            self._evict(oldest, "lru")
+
+        if self._total_bytes > self.max_bytes:
+            logger.warning(f"Session {keep} alone exceeds the store budget ({self._sizes[keep]} bytes)")
+
+    # ---- dict-like API ----
+    def get(self, session_id: str, default: Any = None) -> Any:
+        with self._lock:
+            now = time.time()
+            self._expire_idle(now)
+
+            record = self._sessions.get(session_id)
+            if record is not None and self._deleted_elsewhere(session_id):
+                # Another worker deleted it; drop our stale copy
+                self._drop(session_id)
+                record = None
+            if record is not None:
+                self.hits += 1
+                self._sessions.move_to_end(session_id)
+                self._last_access[session_id] = now
+                return record
+
+        if self.backend is not None:
+            # Loaded outside the lock: reading a large session must not stall other requests
+            record = self._load_from_backend(session_id)
+            if record is not None:
+                with self._lock:
+                    self.backend_loads += 1
+                    current = self._sessions.get(session_id)
+                    if current is not None:
+                        return current
+                    self._insert(session_id, record, time.time())
+                    return record
+
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def put(self, session_id: str, record: Dict[str, Any]) -> None:
+        persisted = False
+        if self.backend is not None:
+            try:
+                record = self.backend.save(session_id, record)
+                persisted = True
+            except Exception as e:
+                self.backend_errors += 1
+                logger.error(f"Failed to persist session {session_id}, keeping it in memory only: {e}")
+            self._maybe_purge_backend()
+
+        with self._lock:
+            if persisted:
+                self._memory_only.discard(session_id)
+            elif self.backend is not None:
+                self._memory_only.add(session_id)
+            self._insert(session_id, record, time.time())
+
+    def _maybe_purge_backend(self) -> None:
+        now = time.time()
+        if now - self._last_purge < BACKEND_PURGE_INTERVAL_SECONDS:
+            return
+        self._last_purge = now
+        try:
+            self.backend.purge_expired()
+        except Exception as e:
+            logger.error(f"Failed to purge expired sessions: {e}")
+
+    def delete(self, session_id: str) -> bool:
+        """Remove a session and its files everywhere. Returns False if it was not stored."""
+        with self._lock:
+            record = self._drop(session_id) if session_id in self._sessions else None
+            owns_files = self._owns_files(session_id)
+            self._memory_only.discard(session_id)
+
+        deleted = record is not None
+        if record is not None and owns_files:
+            _remove_session_files(record)
+        if self.backend is not None:
+            try:
+                deleted = self.backend.delete(session_id) or deleted
+            except Exception as e:
+                self.backend_errors += 1
+                logger.error(f"Failed to delete session {session_id} from backend: {e}")
+
+        return deleted
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.get(session_id) is not None
+
+    def __getitem__(self, session_id: str) -> Dict[str, Any]:
+        record = self.get(session_id)
+        if record is None:
+            raise KeyError(session_id)
+        return record
+
+    def __setitem__(self, session_id: str, record: Dict[str, Any]) -> None:
+        self.put(session_id, record)
+
+    def __delitem__(self, session_id: str) -> None:
+        if not self.delete(session_id):
+            raise KeyError(session_id)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            return iter(list(self._sessions))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._expire_idle(time.time())
+            lookups = self.hits + self.misses
+            return {
+                "sessions": len(self._sessions),
+                "size_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "idle_ttl_seconds": self.idle_ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": dict(self.evictions),
+                "backend": type(self.backend).__name__ if self.backend else None,
+                "backend_loads": self.backend_loads,
+                "backend_errors": self.backend_errors,
+            }
@@ -0,0 +1,99 @@
+import os
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+# Concurrent PDF pipelines and how many more may wait for a free worker
+PIPELINE_MAX_CONCURRENCY = int(os.getenv("PIPELINE_MAX_CONCURRENCY", "2"))
+PIPELINE_MAX_QUEUE = int(os.getenv("PIPELINE_MAX_QUEUE", "4"))
+
+
+class PoolSaturatedError(Exception):
+    """Raised when a job is submitted while every worker and queue slot is taken."""
+
+    def __init__(self, queue_depth: int, capacity: int):
+        super().__init__(f"Worker pool saturated ({queue_depth} jobs queued)")
+        self.queue_depth = queue_depth
+        self.capacity = capacity
+
+
+class BoundedWorkerPool:
+    """
+    Thread pool with admission control.
+
+    Threads (not processes) are used so jobs share the loaded models and the
+    in-process document store; the heavy lifting (torch, tesseract, HTTP)
+    releases the GIL anyway. At most `max_workers` jobs run and at most
+    `max_queue` wait; anything beyond that is rejected immediately.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, name: str = "worker"):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    def queue_depth(self) -> int:
+        with self._lock:
+            return self._submitted - self._running
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        with self._lock:
+            in_flight = self._submitted
+            if in_flight >= self.capacity:
+                self._rejected += 1
+                raise PoolSaturatedError(in_flight - self._running, self.capacity)
+            self._submitted += 1
+
+        def run():
+            with self._lock:
+                self._running += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._submitted -= 1
+                    self._completed += 1
+
+        return self._executor.submit(run)
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Submit from async code and await the result without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queued": self._submitted - self._running,
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+
+
+_PIPELINE_POOL: Optional[BoundedWorkerPool] = None
+_PIPELINE_POOL_LOCK = threading.Lock()
+
+
+def get_pipeline_pool() -> BoundedWorkerPool:
+    """Process-wide pool that runs PDF processing pipelines."""
+    global _PIPELINE_POOL
+    if _PIPELINE_POOL is None:
+        with _PIPELINE_POOL_LOCK:
+            if _PIPELINE_POOL is None:
+                _PIPELINE_POOL = BoundedWorkerPool(
+                    PIPELINE_MAX_CONCURRENCY, PIPELINE_MAX_QUEUE, name="pdf-pipeline"
+                )
+    return _PIPELINE_POOL